@@ -0,0 +1,60 @@
+# The fixed address calling convention against --frames on the tests/codegen programs, run in the interpreter.
+# The executed instructions are split by the semantic routine that wrote them: the calls (the call sequence, the
+# return and the frame setup), the variables (computing frame addresses and initializing) and the rest.
+# usage: python benchmarks/calling_conventions.py [test ...]
+import os
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from parser_constants import grammar_rules
+from prd_parser import Parser, token_reader
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+INTERPRETER = os.path.join(ROOT, "interpreter", "tester_linux.out")
+CALL_ROUTINES = {"#sa_end_function_call", "#sa_function_return_jump", "#sa_begin_function_statement", "#sa_end_function_statement"}
+VARIABLE_ROUTINES = {"#pid", "#sa_decleration_role_variable", "#sa_decleration_role_array"}
+
+
+def run(filename: str, frames: bool):
+    """the PRINTs, the program size, the calls and the executed instructions by kind, None if no code is generated"""
+    parser = Parser([(left, list(right)) for left, right in grammar_rules], tree_mode="none", profile_codegen=True, frames=frames)
+    parser.token_generator = token_reader(parser.scanner, filename)
+    parser.error = lambda message, lineno: None
+    parser.parse()
+    codegen = parser.codegen
+    if codegen.semantic_errors:
+        return None
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "output.txt"), "w") as file:
+            file.write(codegen.PB.render())
+        result = subprocess.run([INTERPRETER], cwd=directory, capture_output=True, text=True)
+    executed = Counter()
+    calls = 0
+    for line in result.stderr.splitlines():
+        if "PC =" not in line:
+            continue
+        pc = int(line.split("PC =")[1].split()[0])
+        command = codegen.PB[pc]
+        calls += command[0] == "JP" and str(command[1]).startswith("@")
+        routine = codegen.comment.get(pc)
+        executed["calls" if routine in CALL_ROUTINES and command[0] != "PRINT" else "variables" if routine in VARIABLE_ROUTINES else "rest"] += 1
+    prints = [line for line in result.stdout.splitlines() if line.startswith("PRINT")]
+    return prints, len(codegen.PB), calls, executed
+
+
+if __name__ == '__main__':
+    tests = sys.argv[1:] or sorted(os.listdir(os.path.join(ROOT, "tests", "codegen")))
+    print("test\tinstructions\tcalls\texecuted for calls (per call)\tfor variables\trest\t(fixed / frames)")
+    for test in tests:
+        filename = os.path.join(ROOT, "tests", "codegen", test, "input.txt")
+        fixed, frames = run(filename, False), run(filename, True)
+        if fixed is None:
+            continue
+        per_call = f" ({fixed[3]['calls'] / fixed[2]:.1f} / {frames[3]['calls'] / frames[2]:.1f})" if fixed[2] else ""
+        note = "" if fixed[0] == frames[0] else "\tPRINTs differ"
+        print(f"{test}\t{fixed[1]} / {frames[1]}\t{fixed[2]}\t{fixed[3]['calls']} / {frames[3]['calls']}{per_call}"
+              f"\t{fixed[3]['variables']} / {frames[3]['variables']}\t{fixed[3]['rest']} / {frames[3]['rest']}{note}")
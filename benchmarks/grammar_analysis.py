@@ -0,0 +1,52 @@
+# FirstFollowCalculator against BitsetFirstFollowCalculator, on grammar_rules and on synthetic grammars
+# usage: python benchmarks/grammar_analysis.py [non-terminal counts...]
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from first_follow_calculator import BitsetFirstFollowCalculator, FirstFollowCalculator
+from parser_constants import EPSILON, Terminal, grammar_rules
+
+OPERATORS = [terminal for terminal in Terminal if terminal not in [Terminal.EPSILON, Terminal.EOF, Terminal.PARAENTHESIS_OPEN, Terminal.PARAENTHESIS_CLOSE, Terminal.ID, Terminal.NUM]]
+
+
+def synthetic_grammar(levels: int, seed: int = 0):
+    """
+    An expression grammar with one precedence level per pair of non-terminals, like Expression/Term and their primes,
+    so FIRST sets flow up and FOLLOW sets flow down a chain as long as the grammar, with some random shortcuts.
+    """
+    rng = random.Random(seed)
+    rules = [("S", ["E0", Terminal.SEMICOLON])]
+    for level in range(levels):
+        operand = f"E{level + 1}" if level + 1 < levels else "Atom"
+        rules.append((f"E{level}", [operand, f"E{level}'"]))
+        rules.append((f"E{level}'", [OPERATORS[level % len(OPERATORS)], operand, f"E{level}'"]))
+        if rng.random() < 0.2:
+            rules.append((f"E{level}'", [f"E{rng.randrange(level, levels)}'", OPERATORS[(level + 1) % len(OPERATORS)]]))
+        rules.append((f"E{level}'", [EPSILON]))
+    rules.append(("Atom", [Terminal.PARAENTHESIS_OPEN, "E0", Terminal.PARAENTHESIS_CLOSE]))
+    rules.append(("Atom", [Terminal.ID]))
+    rules.append(("Atom", [Terminal.NUM]))
+    return rules
+
+def analyze(calculator_class, rules):
+    start = time.perf_counter()
+    calculator = calculator_class(rules)
+    result = calculator.calculate_first_sets(), calculator.calculate_follow_sets(), calculator.calculate_predict_sets()
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] or [100, 300, 1000]
+    grammars = [("grammar_rules", grammar_rules)] + [(f"synthetic, {2 * count + 2} non-terminals", synthetic_grammar(count)) for count in counts]
+    for name, rules in grammars:
+        rounds = 20 if rules is grammar_rules else 1
+        fixed_point_runs = [analyze(FirstFollowCalculator, rules) for _ in range(rounds)]
+        worklist_runs = [analyze(BitsetFirstFollowCalculator, rules) for _ in range(rounds)]
+        assert fixed_point_runs[0][1] == worklist_runs[0][1], f"{name}: the calculators differ"
+        fixed_point = min(elapsed for elapsed, _ in fixed_point_runs)
+        worklist = min(elapsed for elapsed, _ in worklist_runs)
+        print(f"{name}: {len(rules)} rules\tfixed point {fixed_point * 1000:.2f}ms\tworklist {worklist * 1000:.2f}ms\t{fixed_point / worklist:.1f}x")
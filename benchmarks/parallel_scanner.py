@@ -0,0 +1,44 @@
+# Scanner.lex_parallel against sequential lexing, for 1..cpu_count workers
+# usage: python benchmarks/parallel_scanner.py [megabytes] [backend]
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from file_readers import SourceBuffer
+from scanner import Scanner
+
+
+def generate_input(size: int) -> str:
+    samples = [open(filename).read() for filename in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "tests", "codegen", "*", "input.txt")))]
+    sample = "\n".join(samples) + "\n"
+    return sample * (size // len(sample) + 1)
+
+def lex(text: str, backend: str, workers: int):
+    scanner = Scanner(backend=backend)
+    scanner.source = SourceBuffer(text)
+    errors = []
+    scanner.write_error_to_file = lambda *error: errors.append(error)
+    start = time.perf_counter()
+    tokens = scanner.lex_parallel(workers) if workers else list(scanner.iter_tokens())
+    elapsed = time.perf_counter() - start
+    result = [(token.token_type, token.token_string, token.lineno) for token in tokens], errors, list(scanner.symbol_table)
+    return elapsed, result
+
+
+if __name__ == '__main__':
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    backend = sys.argv[2] if len(sys.argv) > 2 else "table"
+    text = generate_input(int(megabytes * (1 << 20)))
+
+    sequential, expected = lex(text, backend, 0)
+    print(f"{len(text) / (1 << 20):.1f} MB, {backend} backend, {len(expected[0])} tokens")
+    print(f"sequential\t{sequential:.2f}s")
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        elapsed, result = lex(text, backend, workers)
+        assert result == expected, f"{workers} workers gave a different result"
+        print(f"{workers} workers\t{elapsed:.2f}s\t{sequential / elapsed:.2f}x")
+        workers *= 2
@@ -0,0 +1,45 @@
+# The parser engines against each other on a synthetic program, per tree mode, with the tokens read beforehand
+# usage: python benchmarks/parser_engines.py [functions]
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from parse_tree import ParseTreeWriter
+from parser_constants import grammar_rules
+from prd_parser import Parser, token_reader
+
+
+def generate_input(functions: int) -> str:
+    """a chain of functions calling each other, kept small enough for the program block"""
+    lines = ["int g;"]
+    for i in range(functions):
+        call = f"f{i - 1}(a - 1)" if i else "a"
+        lines.append(f"int f{i}(int a) {{ int b; int c[4]; b = a * 2 + {call}; c[1] = b; if (b < 10) {{ b = b + 1; }} else {{ b = 3; }} endif "
+                     f"for (b = 0; b < 3; b = b + 1) c[2] = b; return c[1] + b; }}")
+    lines.append(f"void main(void) {{ g = f{functions - 1}(3); output(g); }}")
+    return "\n".join(lines)
+
+def parse(filename: str, engine: str, tree_mode: str) -> float:
+    parser = Parser([(left, list(right)) for left, right in grammar_rules], engine=engine, tree_mode=tree_mode)
+    parser.token_generator = iter(list(token_reader(parser.scanner, filename)))
+    if tree_mode == "stream":
+        parser.tree = ParseTreeWriter(io.BytesIO())
+    start = time.perf_counter()
+    parser.parse()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "input.txt")
+        with open(filename, "w") as file:
+            file.write(generate_input(functions))
+        for tree_mode in Parser.tree_modes:
+            times = {engine: min(parse(filename, engine, tree_mode) for _ in range(5)) for engine in Parser.engines}
+            print(f"{tree_mode} tree:\t" + "\t".join(f"{engine} {elapsed * 1000:.1f}ms" for engine, elapsed in times.items())
+                  + f"\tgenerated {times['recursive'] / times['generated']:.1f}x faster than recursive")
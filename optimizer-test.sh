@@ -0,0 +1,36 @@
+#!/bin/bash
+# compiles every tests/codegen input (or only $1) with and without --optimize,
+# runs both programs in the interpreter and checks that they PRINT the same, and the same as expected.txt if there is one
+
+cd "$(dirname "$0")"
+failed=0
+for test in ${1:-$(ls tests/codegen)}; do
+    rm -rf sandbox
+    mkdir sandbox
+    cp src/*.py sandbox
+    cp tests/codegen/$test/input.txt sandbox
+    cd sandbox
+
+    python compiler.py > /dev/null 2>&1
+    if grep -q "has not been generated" output.txt; then
+        echo "$test: skipped, no code is generated"
+        cd ..
+        continue
+    fi
+    instructions=$(grep -c . output.txt)
+    ../interpreter/tester_linux.out 2> log | head -n -1 > expected
+    python compiler.py --optimize > /dev/null 2> saved
+    ../interpreter/tester_linux.out 2> log | head -n -1 > result
+
+    if ! diff -bBq result expected > /dev/null; then
+        echo "$test: PRINTs are different from the unoptimized program. $(head -n 1 saved) of $instructions, $(tail -n 1 saved)"
+        failed=1
+    elif [ -f ../tests/codegen/$test/expected.txt ] && ! diff -bBq result ../tests/codegen/$test/expected.txt > /dev/null; then
+        echo "$test: OK, PRINTs are same as unoptimized, which differ from expected.txt. $(head -n 1 saved) of $instructions, $(tail -n 1 saved)"
+    else
+        echo "$test: OK, PRINTs are same. $(head -n 1 saved) of $instructions, $(tail -n 1 saved)"
+    fi
+    cd ..
+done
+rm -rf sandbox
+exit $failed
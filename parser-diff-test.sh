@@ -0,0 +1,4 @@
+#!/bin/bash
+
+cd src
+python prd_parser.py ../tests/parser/*/input.txt ../tests/codegen/*/input.txt
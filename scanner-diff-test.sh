@@ -0,0 +1,4 @@
+#!/bin/bash
+
+cd src
+python scanner.py ../tests/scanner/*/input.txt ../tests/parser/*/input.txt ../tests/codegen/*/input.txt
@@ -1,5 +1,9 @@
 
 import enum
+import time
+from typing import Callable, Dict, List, Optional
+
+from program_block import DIRECT, IMMEDIATE, INDIRECT, ProgramBlock
 
 # from termcolor import cprint
 
@@ -63,11 +67,14 @@ class SemanticRoutine(enum.Enum):
 
 VOID_TYPE = 0
 INT_TYPE = 1
+ARRAY_TYPE = 2  # static type of an array operand on the semantic stack
 FUNC_ROLE = 1
 VAR_ROLE = 2
 ARRAY_ROLE = 3
 
 class ScopeItem:
+    __slots__ = ("name", "type", "code_address", "memory_address", "role", "params", "frame_offset")
+
     def __init__(self, name=None, type=None, code_address=None, memory_address=None, role=None, params=None) -> None:
         self.name = name
         self.type = type
@@ -75,64 +82,213 @@ class ScopeItem:
         self.memory_address = memory_address
         self.role = role
         self.params: list[ScopeItem] = params
+        self.frame_offset: Optional[int] = None  # where a param or local is in the frame instead, with frames
 
     def __repr__(self) -> str:
         return f"<{self.name} {self.type} {self.role} {self.code_address} {self.memory_address}>"
 
+# kinds of semantic stack entries
+OPERAND, OPCODE, LABEL = range(3)
+
+class SSEntry:
+    """
+    An entry of the semantic stack: an operand with its addressing mode (DIRECT, IMMEDIATE or INDIRECT as in
+    program_block), static type (None if unknown, e.g. for an undefined name) and the symbol it was read from,
+    an opcode for an instruction still to emit, or a label, the PB index of an instruction to fill in or jump to.
+    value is what goes into the instruction.
+    """
+    __slots__ = ("value", "kind", "mode", "type", "symbol")
+
+    def __init__(self, value, kind: int, mode: Optional[int] = None, type: Optional[int] = None, symbol: Optional[str] = None) -> None:
+        self.value = value
+        self.kind = kind
+        self.mode = mode
+        self.type = type
+        self.symbol = symbol
+
+    @staticmethod
+    def operand(value, type: Optional[int] = INT_TYPE, symbol: Optional[str] = None) -> "SSEntry":
+        mode = IMMEDIATE if isinstance(value, str) and value.startswith("#") else INDIRECT if isinstance(value, str) and value.startswith("@") else DIRECT
+        return SSEntry(value, OPERAND, mode, type, symbol)
+
+    @staticmethod
+    def opcode(name: str) -> "SSEntry":
+        return SSEntry(name, OPCODE)
+
+    @staticmethod
+    def label(index: int) -> "SSEntry":
+        return SSEntry(index, LABEL)
+
+    def __repr__(self) -> str:
+        return repr(self.value)
+
 SP_ADDR = 0
 JUMP_TO_MAIN_ADDR = 1
 
+# with frames: the frame pointer, two cells for addresses used right away, and the layout of a frame,
+# the caller's frame pointer and the return address followed by the params and the locals
+FP_ADDR = 4
+SCRATCH_ADDRS = (8, 12)
+LINK_OFFSET = 0
+RETURN_ADDRESS_OFFSET = 4
+FRAME_HEADER_SIZE = 8
+
+# the machine's words are 32 bit: it clamps immediates to this range and wraps results around
+WORD_MIN = -(1 << 31)
+WORD_MAX = (1 << 31) - 1
+
+def wrap_word(value: int) -> int:
+    return (value - WORD_MIN) % (1 << 32) + WORD_MIN
+
+class ProfiledProgramBlock(ProgramBlock):
+    """the PB of a profiled CodeGen: counts the writes and notes the routine making each one in comment"""
+    def __init__(self, comment: Dict[int, str]):
+        super().__init__()
+        self.comment = comment
+        self.routine: Optional[SemanticRoutine] = None
+        self.writes = 0
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self.writes += 1
+        if self.routine is not None:
+            self.comment[index] = f"{self.routine}"
+
 class CodeGen:
-    def __init__(self) -> None:
-        self.scope_stack = [ScopeItem("output", VOID_TYPE, None, None, FUNC_ROLE, [INT_TYPE])]
-        self.PB = [None] * 10000
-        self.comment = [None] * 10000 # for debugging
+    def __init__(self, profile: bool = False, fold_constants: bool = False, reuse_temps: bool = False, frames: bool = False) -> None:
+        self.scope_stack: list[Optional[ScopeItem]] = []  # declarations in scope, None marking where a scope begins
+        # the items of scope_stack by name, in stack order, so the last one is the visible one
+        self.items_by_name: Dict[Optional[str], list[ScopeItem]] = {}
+        self.push_scope_item(ScopeItem("output", VOID_TYPE, None, None, FUNC_ROLE, [INT_TYPE]))
+        self.comment: Dict[int, str] = {} # for debugging, filled in when profiling
+        self.PB = ProfiledProgramBlock(self.comment) if profile else ProgramBlock()
         self.PB[0] = ["ASSIGN", "#4", SP_ADDR, None] # set the stack pointer to 4
         self.PB_index = JUMP_TO_MAIN_ADDR + 1
 
         self.PARAM_COUNTER = 500
 
-        self.SS = []
+        self.SS: list[SSEntry] = []
         self.function_call_stack: list[ScopeItem] = []
         self.function_declaration_stack: list[ScopeItem] = []
         self.for_break_SS: list[list[int]] = []
         self.pb_list = []
         self.semantic_errors = []
         self.global_var_initializations = []
-
-    def SS_push(self, item):
-        self.SS.append(item)
+        # operations on immediates only give an immediate instead of an instruction
+        self.fold_constants = fold_constants
+        # for the peephole optimizer: the temp addresses, and the PB indices of instructions storing a return address
+        self.temps: set[int] = set()
+        self.return_address_instructions: list[int] = []
+        # per local or temp saved around a recursive call: PB indices of its save, of its restore and of the code after the call
+        self.spills: list[tuple[int, int, int]] = []
+        # for reachability pruning: every function with the PB index its code ends at, and the PB indices of the
+        # initializations of globals at the start of main
+        self.functions: list[tuple[ScopeItem, int]] = []
+        self.global_initialization_indices: list[int] = []
+        # temps popped off SS are handed out again by gettemp, within the function they were taken in
+        self.reuse_temps = reuse_temps
+        self.free_temps: list[int] = []
+        self.temp_count = 0  # gettemp calls, the temps there would be without reuse
+        # params and locals live in a frame on the stack, addressed from FP_ADDR, instead of at fixed addresses
+        self.frames = frames
+        self.frame_size = 0  # of the function being compiled so far
+        self.frame_size_index = None  # PB index of its prologue, which is given the size at the end of the function
+        self.frame_temps: Dict[int, int] = {}  # temps holding the address of a frame slot, by temp: the slot's offset
+
+        # the method of every semantic routine, looked up once instead of by name on every call
+        self.routines: Dict[SemanticRoutine, Callable] = {
+            routine: getattr(self, str(routine).replace('#', 'semantic_routine__')) for routine in SemanticRoutine
+        }
+        # per routine when profiling: [calls, seconds, PB writes]
+        self.profile: Optional[Dict[SemanticRoutine, List]] = None
+        if profile:
+            self.profile = {}
+            for routine, method in self.routines.items():
+                self.routines[routine] = self.profiled(routine, method)
+
+    def SS_push(self, entry: SSEntry):
+        self.SS.append(entry)
 
     def SS_pop(self, count=1):
-        self.SS = self.SS[:-count]
+        if self.reuse_temps:
+            for entry in self.SS[-count:]:
+                self.free_temp(entry)
+        del self.SS[-count:]
+
+    def SS_entry(self, idx=0) -> SSEntry:
+        """return the entry SS(top-idx)"""
+        assert idx>=0, "SS_entry only takes positive elements!"
+        return self.SS[-1-idx]
 
     def SS_top(self, idx=0):
         """return SS(top-idx)"""
         assert idx>=0, "SS_top only takes positive elements!"
-        res = self.SS[-1-idx]
-        return res[0] if isinstance(res, tuple) else res
+        return self.SS[-1-idx].value
 
 
+    def push_scope_item(self, scope_item: ScopeItem):
+        self.scope_stack.append(scope_item)
+        self.items_by_name.setdefault(scope_item.name, []).append(scope_item)
+
+    def pop_scope_item(self) -> Optional[ScopeItem]:
+        scope_item = self.scope_stack.pop()
+        if scope_item is not None:
+            # nothing above it on the stack anymore, so it is the last one of its name
+            self.items_by_name[scope_item.name].pop()
+        return scope_item
+
+    def set_top_name(self, name):
+        scope_item = self.scope_stack[-1]
+        self.items_by_name[scope_item.name].pop()
+        scope_item.name = name
+        self.items_by_name.setdefault(name, []).append(scope_item)
+
     def get_scope_item(self, name):
-        for scope_item in self.scope_stack[::-1]:
-            if scope_item and scope_item.name == name:
-                return scope_item
-        return None
-
-    def getaddr(self, name):
-        for scope_item in self.scope_stack[::-1]:
-            if scope_item and scope_item.name == name:
-                return scope_item.memory_address
-        self.report_semantic_error(f"'{name}' is not defined.")
-        return None
-
-    def _is_array(self, address):
-        for scope_item in self.scope_stack[::-1]:
-            if scope_item and scope_item.memory_address == address:
-                # print(scope_item, scope_item.role == ARRAY_ROLE)
-                # if scope_item.role == ARRAY_ROLE:
-                return scope_item.role == ARRAY_ROLE
-        return False
+        scope_items = self.items_by_name.get(name)
+        return scope_items[-1] if scope_items else None
+
+    def getaddr(self, name) -> SSEntry:
+        """the operand a name stands for, typed after its declaration"""
+        scope_item = self.get_scope_item(name)
+        if scope_item is None:
+            self.report_semantic_error(f"'{name}' is not defined.")
+            return SSEntry.operand(None, None, name)
+        if scope_item.frame_offset is not None:
+            address = f"@{self._frame_address(scope_item.frame_offset)}"
+            return SSEntry.operand(address, ARRAY_TYPE if scope_item.role == ARRAY_ROLE else scope_item.type, name)
+        return SSEntry.operand(scope_item.memory_address, ARRAY_TYPE if scope_item.role == ARRAY_ROLE else scope_item.type, name)
+
+    def _is_array(self, idx=0):
+        """whether the operand SS(top-idx) is an array"""
+        return self.SS_entry(idx).type == ARRAY_TYPE
+
+    def _immediate(self, idx=0) -> Optional[int]:
+        """the value of SS(top-idx) if constants are folded and it is an immediate, as the machine reads it"""
+        entry = self.SS_entry(idx)
+        if not self.fold_constants or entry.kind != OPERAND or entry.mode != IMMEDIATE:
+            return None
+        return min(max(int(entry.value[1:]), WORD_MIN), WORD_MAX)
+
+    def _fold(self, count: int, value: int):
+        """replaces the top count entries, an operation on immediates, with its result"""
+        self.SS_pop(count)
+        self.SS_push(SSEntry.operand(f"#{wrap_word(value)}"))
+
+    def _frame_address(self, offset: int) -> int:
+        """a new temp holding the address of the slot at offset in the current frame"""
+        t = self.gettemp()
+        self.PB[self.PB_index] = ["ADD", FP_ADDR, f"#{offset}", t]
+        self.PB_index += 1
+        self.frame_temps[t] = offset
+        return t
+
+    def _allocate_frame_slot(self, scope_item: ScopeItem, size: int = 4):
+        scope_item.frame_offset = self.frame_size
+        self.frame_size += size
+
+    def _place_stack(self):
+        """frames go on the stack, which starts after everything given a fixed address so far"""
+        self.PB[0] = ["ASSIGN", f"#{self.PARAM_COUNTER}", SP_ADDR, None]
 
     def _initialize_variable(self, line):
         if len(self.function_declaration_stack) == 0:
@@ -141,23 +297,61 @@ class CodeGen:
             self.PB[self.PB_index] = line
             self.PB_index += 1
 
+    def temp_of(self, entry: SSEntry) -> Optional[int]:
+        """the temp an operand reads, directly or as the address of an array element"""
+        if entry.kind != OPERAND:
+            return None
+        if entry.mode == INDIRECT:
+            address = int(entry.value[1:])
+        elif isinstance(entry.value, int):
+            address = entry.value
+        else:
+            return None
+        return address if address in self.temps else None
+
+    def free_temp(self, entry: SSEntry):
+        # every instruction reading the operand is written once it leaves SS, backpatched ones included
+        temp = self.temp_of(entry)
+        if temp is not None and temp not in self.free_temps:
+            self.free_temps.append(temp)
+
     def gettemp(self):
+        self.temp_count += 1
+        if self.free_temps:
+            temp = self.free_temps.pop()
+            self.frame_temps.pop(temp, None)
+            return temp
         self.PARAM_COUNTER += 4
+        self.temps.add(self.PARAM_COUNTER - 4)
         return self.PARAM_COUNTER - 4
 
     def code_gen(self, semantic_routine: SemanticRoutine, lineno, *args):
-        debug = False
-        if debug:
-            from copy import deepcopy
-            checkpoint = deepcopy(self.PB)
-
         self._lineno = lineno
-        self.__getattribute__(f"{str(semantic_routine).replace('#', 'semantic_routine__')}")(*args)
-
-        if debug:
-            for i, item in enumerate(self.PB):
-                if item != checkpoint[i]:
-                    self.comment[i] = f"{semantic_routine}"
+        self.routines[semantic_routine](*args)
+
+    def profiled(self, routine: SemanticRoutine, method: Callable) -> Callable:
+        stats = self.profile[routine] = [0, 0.0, 0]
+        def call(*args):
+            self.PB.routine = routine
+            writes = self.PB.writes
+            start = time.perf_counter()
+            method(*args)
+            stats[1] += time.perf_counter() - start
+            stats[0] += 1
+            stats[2] += self.PB.writes - writes
+        return call
+
+    def profile_report(self) -> str:
+        """calls, time and PB writes of the routines that ran, the most time first"""
+        lines = [f"{'routine':<32}{'calls':>8}{'total ms':>11}{'us/call':>9}{'PB writes':>11}"]
+        for routine, (calls, seconds, writes) in sorted(self.profile.items(), key=lambda item: -item[1][1]):
+            if calls:
+                lines.append(f"{str(routine):<32}{calls:>8}{seconds * 1000:>11.3f}{seconds * 1e6 / calls:>9.2f}{writes:>11}")
+        calls = sum(stats[0] for stats in self.profile.values())
+        seconds = sum(stats[1] for stats in self.profile.values())
+        writes = sum(stats[2] for stats in self.profile.values())
+        lines.append(f"{'total':<32}{calls:>8}{seconds * 1000:>11.3f}{seconds * 1e6 / max(calls, 1):>9.2f}{writes:>11}")
+        return "\n".join(lines) + "\n"
 
     def report_semantic_error(self, msg, pb_add=None):
         if pb_add is not None and pb_add in self.pb_list:
@@ -177,7 +371,7 @@ class CodeGen:
 
     def semantic_routine__scope_exit(self, *args):
         while True:
-            scope_item = self.scope_stack.pop()
+            scope_item = self.pop_scope_item()
             if scope_item is None:
                 break
 
@@ -185,11 +379,11 @@ class CodeGen:
         self.SS_push(self.getaddr(id))
 
     def semantic_routine__pnum(self, num, *args):
-        self.SS_push(f"#{num}")
+        self.SS_push(SSEntry.operand(f"#{num}", INT_TYPE, num))
 
     # decleration:
     def semantic_routine__sa_begin_decleration(self, *args):
-        self.scope_stack.append(ScopeItem())
+        self.push_scope_item(ScopeItem())
 
     def semantic_routine__sa_type_specifier_int(self, *args):
         self.scope_stack[-1].type = INT_TYPE
@@ -198,7 +392,7 @@ class CodeGen:
         self.scope_stack[-1].type = VOID_TYPE
 
     def semantic_routine__sa_assign_name(self, name, *args):
-        self.scope_stack[-1].name = name
+        self.set_top_name(name)
 
     def semantic_routine__sa_decleration_role_function(self, *args):
         self.scope_stack[-1].role = FUNC_ROLE
@@ -208,6 +402,9 @@ class CodeGen:
         self.PARAM_COUNTER += 4
 
         self.function_declaration_stack.append(self.scope_stack[-1])
+        # a call must not overwrite the live temps of its caller, so functions do not share temps
+        self.free_temps = []
+        self.frame_size = FRAME_HEADER_SIZE
 
         # if self.scope_stack[-1].type == INT_TYPE:
         if True: # leave RETURN_ADDRESS for void functions to match output of testcases
@@ -215,6 +412,16 @@ class CodeGen:
 
     def semantic_routine__sa_decleration_role_variable(self, *args):
         self.scope_stack[-1].role = VAR_ROLE
+        if self.frames and self.function_declaration_stack:
+            if self.scope_stack[-1].type == INT_TYPE:
+                self._allocate_frame_slot(self.scope_stack[-1])
+                self.PB[self.PB_index] = ["ADD", FP_ADDR, f"#{self.scope_stack[-1].frame_offset}", SCRATCH_ADDRS[0]]
+                self.PB_index += 1
+                self.PB[self.PB_index] = ["ASSIGN", "#0", f"@{SCRATCH_ADDRS[0]}", None]
+                self.PB_index += 1
+            else:
+                self.report_semantic_error(f"Illegal type of void for '{self.scope_stack[-1].name}'.")
+            return
 
         self.scope_stack[-1].memory_address = self.PARAM_COUNTER
         if self.scope_stack[-1].type == INT_TYPE:
@@ -223,6 +430,8 @@ class CodeGen:
         else:
             self.report_semantic_error(f"Illegal type of void for '{self.scope_stack[-1].name}'.")
             #print("ERROR: void variable decleration")
+        if self.frames:
+            self._place_stack()
 
     def semantic_routine__sa_decleration_role_array(self, *args):
         self.scope_stack[-1].role = ARRAY_ROLE
@@ -233,21 +442,41 @@ class CodeGen:
             self.report_semantic_error(f"Illegal type of void for '{self.scope_stack[-1].name}'.")
             
         n = int(self.SS_top()[1:]) + 1
-        self.PARAM_COUNTER += 4 * n
         self.SS_pop()
+        if self.frames and self.function_declaration_stack:
+            # the elements follow the slot of the array, which holds their address
+            self.scope_stack[-1].memory_address = None
+            self._allocate_frame_slot(self.scope_stack[-1], 4 * n)
+            offset = self.scope_stack[-1].frame_offset
+            self.PB[self.PB_index] = ["ADD", FP_ADDR, f"#{offset + 4}", SCRATCH_ADDRS[0]]
+            self.PB_index += 1
+            self.PB[self.PB_index] = ["ADD", FP_ADDR, f"#{offset}", SCRATCH_ADDRS[1]]
+            self.PB_index += 1
+            self.PB[self.PB_index] = ["ASSIGN", SCRATCH_ADDRS[0], f"@{SCRATCH_ADDRS[1]}", None]
+            self.PB_index += 1
+            return
+        self.PARAM_COUNTER += 4 * n
         addr = self.scope_stack[-1].memory_address
         self._initialize_variable(["ASSIGN", f"#{addr + 4}", addr, None])
+        if self.frames:
+            self._place_stack()
 
     def semantic_routine__sa_param_role_int(self, *args):
         self.scope_stack[-1].role = VAR_ROLE
-        self.scope_stack[-1].memory_address = self.PARAM_COUNTER
-        self.PARAM_COUNTER += 4
+        if self.frames:
+            self._allocate_frame_slot(self.scope_stack[-1])
+        else:
+            self.scope_stack[-1].memory_address = self.PARAM_COUNTER
+            self.PARAM_COUNTER += 4
         self.function_declaration_stack[-1].params.append(self.scope_stack[-1])
 
     def semantic_routine__sa_param_role_array(self, *args):
         self.scope_stack[-1].role = ARRAY_ROLE
-        self.scope_stack[-1].memory_address = self.PARAM_COUNTER
-        self.PARAM_COUNTER += 4
+        if self.frames:
+            self._allocate_frame_slot(self.scope_stack[-1])
+        else:
+            self.scope_stack[-1].memory_address = self.PARAM_COUNTER
+            self.PARAM_COUNTER += 4
         self.function_declaration_stack[-1].params.append(self.scope_stack[-1])
 
     def semantic_routine__sa_begin_function_statement(self, *args):
@@ -255,13 +484,24 @@ class CodeGen:
         if  self.function_declaration_stack[-1].name == "main":
             self.PB[JUMP_TO_MAIN_ADDR] = ["JP", self.PB_index, None, None]
             for line in self.global_var_initializations:
+                self.global_initialization_indices.append(self.PB_index)
                 self.PB[self.PB_index] = line
                 self.PB_index += 1
+        if self.frames:
+            if self.function_declaration_stack[-1].name == "main":
+                self.PB[self.PB_index] = ["ASSIGN", SP_ADDR, FP_ADDR, None]
+                self.PB_index += 1
+            # the frame is allocated with one bump of SP, by a size only known at the end of the function
+            self.frame_size_index = self.PB_index
+            self.PB_index += 1
 
     def semantic_routine__sa_end_function_statement(self, *args):
         while self.scope_stack[-1] != self.function_declaration_stack[-1]:
-            self.scope_stack.pop()
-        self.function_declaration_stack.pop()
+            self.pop_scope_item()
+        self.functions.append((self.function_declaration_stack.pop(), self.PB_index))
+        if self.frames:
+            self.PB[self.frame_size_index] = ["ADD", FP_ADDR, f"#{self.frame_size}", SP_ADDR]
+            self._place_stack()
 
     def semantic_routine__sa_function_return_value(self, *args):
         if self.function_declaration_stack[-1].type == VOID_TYPE:
@@ -272,7 +512,19 @@ class CodeGen:
         self.SS_pop()
 
     def semantic_routine__sa_function_return_jump(self, *args):
-        if self.function_declaration_stack[-1].name != "main":
+        if self.function_declaration_stack[-1].name != "main" and self.frames:
+            # pop the frame, back to the caller's, and jump to the return address it had
+            self.PB[self.PB_index] = ["ADD", FP_ADDR, f"#{RETURN_ADDRESS_OFFSET}", SCRATCH_ADDRS[0]]
+            self.PB_index += 1
+            self.PB[self.PB_index] = ["ASSIGN", f"@{SCRATCH_ADDRS[0]}", SCRATCH_ADDRS[1], None]
+            self.PB_index += 1
+            self.PB[self.PB_index] = ["ASSIGN", FP_ADDR, SP_ADDR, None]
+            self.PB_index += 1
+            self.PB[self.PB_index] = ["ASSIGN", f"@{SP_ADDR}", FP_ADDR, None]  # the link is at LINK_OFFSET, 0
+            self.PB_index += 1
+            self.PB[self.PB_index] = ["JP", f"@{SCRATCH_ADDRS[1]}", None, None]
+            self.PB_index += 1
+        elif self.function_declaration_stack[-1].name != "main":
             self.PB[self.PB_index] = ["JP", f"@{self.function_declaration_stack[-1].memory_address}", None, None]
             self.PB_index += 1
 
@@ -296,28 +548,39 @@ class CodeGen:
             self.PB_index += 1
             self.SS_pop()
             return
+        if self.frames:
+            self._frame_call(func_scope_item)
+            return
 
         save_addresses = []
+        own_addresses = set()  # what only this function reads, unlike a global, so its save may go if it is dead after the call
         if func_scope_item == current_function_item:
             # recursive function:
             save_addresses = [current_function_item.memory_address] # RETURN JUMP ADDRESS
             # skip RETURN VALUE
             # for i in range(current_function_item.memory_address+8, self.PARAM_COUNTER, 4):
             #     save_addresses.append(i)
-            for scope_item in self.scope_stack[::-1]:
+            for scope_item in reversed(self.scope_stack):
                 if not scope_item:
                     continue
                 if scope_item == current_function_item:
                     break
                 # print(scope_item)
                 save_addresses.append(scope_item.memory_address)
-
-            for addr in self.SS:
-                if isinstance(addr, int) and addr not in save_addresses:
-                    save_addresses.append(addr)
+            own_addresses = set(save_addresses) | self.temps
+
+            for entry in self.SS:
+                if entry.kind == OPERAND and isinstance(entry.value, int) and entry.value not in save_addresses:
+                    save_addresses.append(entry.value)
+                elif entry.mode == INDIRECT and self.temp_of(entry) not in (None, *save_addresses):
+                    # the callee runs the instruction computing this element's address again,
+                    # and with reuse_temps may write the temp anywhere in its body
+                    save_addresses.append(self.temp_of(entry))
             # print("*"*20, save_addresses)
 
+        save_indices = []
         for addr in save_addresses:
+            save_indices.append(self.PB_index)
             self.PB[self.PB_index] = ["ASSIGN", addr, f"@{SP_ADDR}", None]
             self.PB_index += 1
             self.PB[self.PB_index] = ["ADD", "#4", SP_ADDR, SP_ADDR]
@@ -336,29 +599,34 @@ class CodeGen:
             # TODO: check SS_top() type
             if param.role == VAR_ROLE:
                 # print(param.memory_address, self.SS_top())
-                if self._is_array(self.SS_top()):
+                if self._is_array():
                     self.report_semantic_error(f"Mismatch in type of argument {n} of '{func_scope_item.name}'. Expected 'int' but got 'array' instead.")
                 self.PB[self.PB_index] = ["ASSIGN", self.SS_top(), param.memory_address, None]
                 self.PB_index += 1
             elif param.role == ARRAY_ROLE:
-                if not self._is_array(self.SS_top()):
+                if not self._is_array():
                     self.report_semantic_error(f"Mismatch in type of argument {n} of '{func_scope_item.name}'. Expected 'array' but got 'int' instead.")
                 self.PB[self.PB_index] = ["ASSIGN", self.SS_top(), param.memory_address, None]
                 self.PB_index += 1
             self.SS_pop()
             n -= 1
 
+        self.return_address_instructions.append(self.PB_index)
         self.PB[self.PB_index] = ["ASSIGN", f"#{self.PB_index+2}", f"{func_scope_item.memory_address}", None]
         self.PB_index += 1
 
         self.PB[self.PB_index] = ["JP", func_scope_item.code_address, None, None]
         self.PB_index += 1
 
+        restore_indices = []
         for addr in save_addresses[::-1]:
+            restore_indices.append(self.PB_index)
             self.PB[self.PB_index] = ["SUB", SP_ADDR, "#4", SP_ADDR]
             self.PB_index += 1
             self.PB[self.PB_index] = ["ASSIGN", f"@{SP_ADDR}", addr, None]
             self.PB_index += 1
+        self.spills.extend((save, restore, self.PB_index) for addr, save, restore in zip(save_addresses, save_indices, reversed(restore_indices))
+                           if addr in own_addresses)
 
         t = self.gettemp()
         if func_scope_item.type == INT_TYPE:
@@ -367,33 +635,113 @@ class CodeGen:
             self.PB[self.PB_index] = ["ASSIGN", "#0", t, None]
         self.PB_index += 1
         self.SS_pop() # pop the function address
-        self.SS_push(t)
+        self.SS_push(SSEntry.operand(t))
+
+
+    def _frame_call(self, func_scope_item: ScopeItem):
+        """
+        a call with frames: the temps below the call on SS are pushed on the stack, the callee's frame starts
+        on top of them with the link to the caller's frame, the return address and the arguments, and the callee
+        bumps SP over the rest of it. Temps holding an address in the caller's frame are computed again instead.
+        """
+        n = len(func_scope_item.params)
+        for i in range(n):
+            if self.SS_top(i) is None or self.SS_top() == func_scope_item.memory_address:
+                self.report_semantic_error(f"Mismatch in numbers of arguments of '{func_scope_item.name}'.")
+                return
+        if self.SS_top(n) != func_scope_item.memory_address:
+            self.report_semantic_error(f"Mismatch in numbers of arguments of '{func_scope_item.name}'.")
+            return
 
+        saved, recomputed = [], []
+        for entry in self.SS[:-(n + 1)]:
+            temp = self.temp_of(entry)
+            if temp is not None and temp not in saved and temp not in recomputed:
+                (recomputed if temp in self.frame_temps else saved).append(temp)
+        save_indices = []
+        for temp in saved:
+            save_indices.append(self.PB_index)
+            self.PB[self.PB_index] = ["ASSIGN", temp, f"@{SP_ADDR}", None]
+            self.PB_index += 1
+            self.PB[self.PB_index] = ["ADD", "#4", SP_ADDR, SP_ADDR]
+            self.PB_index += 1
+
+        for param in func_scope_item.params[::-1]:
+            if param.role == VAR_ROLE and self._is_array():
+                self.report_semantic_error(f"Mismatch in type of argument {n} of '{func_scope_item.name}'. Expected 'int' but got 'array' instead.")
+            elif param.role == ARRAY_ROLE and not self._is_array():
+                self.report_semantic_error(f"Mismatch in type of argument {n} of '{func_scope_item.name}'. Expected 'array' but got 'int' instead.")
+            self.PB[self.PB_index] = ["ADD", SP_ADDR, f"#{param.frame_offset}", SCRATCH_ADDRS[0]]
+            self.PB_index += 1
+            self.PB[self.PB_index] = ["ASSIGN", self.SS_top(), f"@{SCRATCH_ADDRS[0]}", None]
+            self.PB_index += 1
+            self.SS_pop()
+            n -= 1
+
+        self.PB[self.PB_index] = ["ASSIGN", FP_ADDR, f"@{SP_ADDR}", None]  # the link is at LINK_OFFSET, 0
+        self.PB_index += 1
+        self.PB[self.PB_index] = ["ASSIGN", SP_ADDR, FP_ADDR, None]
+        self.PB_index += 1
+        self.PB[self.PB_index] = ["ADD", FP_ADDR, f"#{RETURN_ADDRESS_OFFSET}", SCRATCH_ADDRS[0]]
+        self.PB_index += 1
+        self.return_address_instructions.append(self.PB_index)
+        self.PB[self.PB_index] = ["ASSIGN", f"#{self.PB_index+2}", f"@{SCRATCH_ADDRS[0]}", None]
+        self.PB_index += 1
+        self.PB[self.PB_index] = ["JP", func_scope_item.code_address, None, None]
+        self.PB_index += 1
+
+        restore_indices = []
+        for temp in saved[::-1]:
+            restore_indices.append(self.PB_index)
+            self.PB[self.PB_index] = ["SUB", SP_ADDR, "#4", SP_ADDR]
+            self.PB_index += 1
+            self.PB[self.PB_index] = ["ASSIGN", f"@{SP_ADDR}", temp, None]
+            self.PB_index += 1
+        self.spills.extend((save, restore, self.PB_index) for save, restore in zip(save_indices, reversed(restore_indices)))
+        for temp in recomputed:
+            self.PB[self.PB_index] = ["ADD", FP_ADDR, f"#{self.frame_temps[temp]}", temp]
+            self.PB_index += 1
+
+        t = self.gettemp()
+        if func_scope_item.type == INT_TYPE:
+            self.PB[self.PB_index] = ["ASSIGN", f"{func_scope_item.memory_address+4}", t, None]
+        else:
+            self.PB[self.PB_index] = ["ASSIGN", "#0", t, None]
+        self.PB_index += 1
+        self.SS_pop() # pop the function address
+        self.SS_push(SSEntry.operand(t))
 
     # algebraic:
     def semantic_routine__push_plus(self, *args):
-        self.SS_push("ADD")
+        self.SS_push(SSEntry.opcode("ADD"))
 
     def semantic_routine__push_minus(self, *args):
-        self.SS_push("SUB")
+        self.SS_push(SSEntry.opcode("SUB"))
 
     def semantic_routine__negate_ss_top(self, *args):
-        if isinstance(self.SS_top(), str) and self.SS_top().startswith("#"):
-            self.SS[-1] = f"#{-int(self.SS_top()[1:])}"
+        if self.SS_entry().mode == IMMEDIATE and self.SS_entry().symbol is None and self._immediate() is not None:
+            # a folded result, unlike a literal wraps around like the SUB it stands for
+            self._fold(1, -self._immediate())
+        elif self.SS_entry().mode == IMMEDIATE:
+            self.SS[-1] = SSEntry.operand(f"#{-int(self.SS_top()[1:])}", INT_TYPE, self.SS_entry().symbol)
             # TODO: remove this if it causes problems
         else:
             t = self.gettemp()
             self.PB[self.PB_index] = ["SUB", "#0", self.SS_top(), t]
             self.PB_index += 1
             self.SS_pop()
-            self.SS_push(t)
+            self.SS_push(SSEntry.operand(t))
 
     def semantic_routine__do_addop(self, *args):
+        a, b = self._immediate(2), self._immediate()
+        if a is not None and b is not None and self.SS_top(1) in ("ADD", "SUB"):
+            self._fold(3, a + b if self.SS_top(1) == "ADD" else a - b)
+            return
         t = self.gettemp()
         self.PB[self.PB_index] = [self.SS_top(1), self.SS_top(2), self.SS_top(), t]
         
-        X = self._is_array(self.SS_top(2))
-        Y = self._is_array(self.SS_top())
+        X = self._is_array(2)
+        Y = self._is_array()
             
         if X != Y:
             x = 'array' if X else 'int'
@@ -402,26 +750,30 @@ class CodeGen:
             
         self.PB_index += 1
         self.SS_pop(3)
-        self.SS_push(t)
+        self.SS_push(SSEntry.operand(t))
 
     def semantic_routine__push_relop_greater(self, *args):
-        self.SS_push("LT")
+        self.SS_push(SSEntry.opcode("LT"))
 
     def semantic_routine__push_relop_equal(self, *args):
-        self.SS_push("EQ")
+        self.SS_push(SSEntry.opcode("EQ"))
 
     def semantic_routine__do_relop(self, *args):
+        a, b = self._immediate(2), self._immediate()
+        if a is not None and b is not None and self.SS_top(1) in ("LT", "EQ"):
+            self._fold(3, int(a < b if self.SS_top(1) == "LT" else a == b))
+            return
         t = self.gettemp()
         self.PB[self.PB_index] = [self.SS_top(1), self.SS_top(2), self.SS_top(), t]
         self.PB_index += 1
         self.SS_pop(3)
-        self.SS_push(t)
+        self.SS_push(SSEntry.operand(t))
 
     def semantic_routine__pid_assign(self, *args):
         self.PB[self.PB_index] = ["ASSIGN", self.SS_top(), self.SS_top(1), None]
         
-        Y = self._is_array(self.SS_top())
-        X = self._is_array(self.SS_top(1))
+        Y = self._is_array()
+        X = self._is_array(1)
         
         if X != Y:
             x = 'array' if X else 'int'
@@ -432,11 +784,15 @@ class CodeGen:
         self.SS_pop(1) # NOTE: only pop 1, and the result remains on top of the stack
 
     def semantic_routine__do_multiply(self, *args):
+        a, b = self._immediate(), self._immediate(1)
+        if a is not None and b is not None:
+            self._fold(2, a * b)
+            return
         t = self.gettemp()
         self.PB[self.PB_index] = ["MULT", self.SS_top(), self.SS_top(1), t]
         
-        X = self._is_array(self.SS_top())
-        Y = self._is_array(self.SS_top(1))
+        X = self._is_array()
+        Y = self._is_array(1)
             
         if X != Y:
             x = 'array' if X else 'int'
@@ -446,7 +802,7 @@ class CodeGen:
         
         self.PB_index += 1
         self.SS_pop(2)
-        self.SS_push(t)
+        self.SS_push(SSEntry.operand(t))
 
     def semantic_routine__sa_check_break_jp_save(self, *args):
         is_for = len(self.for_break_SS)
@@ -461,11 +817,11 @@ class CodeGen:
         self.SS_pop()
 
     def semantic_routine__save(self, *args):
-        self.SS_push((self.PB_index, 'label'))
+        self.SS_push(SSEntry.label(self.PB_index))
         self.PB_index += 1
 
     def semantic_routine__label(self, *args):
-        self.SS_push((self.PB_index, 'label'))
+        self.SS_push(SSEntry.label(self.PB_index))
 
     def semantic_routine__jpf(self, *args):
         self.PB[self.SS_top()] = ["JPF", self.SS_top(1), self.PB_index, None]
@@ -474,7 +830,7 @@ class CodeGen:
     def semantic_routine__jpf_save(self, *args):
         self.PB[self.SS_top()] = ["JPF", self.SS_top(1), self.PB_index + 1, None]
         self.SS_pop(2)
-        self.SS_push((self.PB_index, 'label'))
+        self.SS_push(SSEntry.label(self.PB_index))
         self.PB_index += 1
 
     def semantic_routine__jp(self, *args):
@@ -484,9 +840,9 @@ class CodeGen:
     def semantic_routine__save_jump(self, *args):
         t = self.gettemp()
         self.PB[self.PB_index] = ["EQ", self.SS_top(), "#0", t]
-        self.SS_push((self.PB_index + 2, 'label'))
-        self.SS_push(t)
-        self.SS_push((self.PB_index + 1, 'label'))
+        self.SS_push(SSEntry.label(self.PB_index + 2))
+        self.SS_push(SSEntry.operand(t))
+        self.SS_push(SSEntry.label(self.PB_index + 1))
         self.PB_index += 3
 
     def semantic_routine__jump_fill(self, *args):
@@ -509,11 +865,18 @@ class CodeGen:
     
     def semantic_routine__sa_index_array_pop(self,  *args):
         t = self.gettemp()
-        self.PB[self.PB_index] = ["MULT", self.SS_top(), "#4", t]
-        self.PB_index += 1
+        index = self._immediate()
+        if index is not None:
+            # the array is a pointer only known at run time, but the offset is constant
+            offset = f"#{wrap_word(index * 4)}"
+        else:
+            self.PB[self.PB_index] = ["MULT", self.SS_top(), "#4", t]
+            self.PB_index += 1
+            offset = t
         self.SS_pop()
-        self.PB[self.PB_index] = ["ADD", self.SS_top(), t, t]
+        self.PB[self.PB_index] = ["ADD", self.SS_top(), offset, t]
         self.PB_index += 1
+        symbol = self.SS_entry().symbol
         self.SS_pop()
-        self.SS_push("@" + str(t))
+        self.SS_push(SSEntry.operand("@" + str(t), INT_TYPE, symbol))
 
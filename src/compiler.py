@@ -4,13 +4,23 @@
 import sys
 
 from parser_constants import grammar_rules
+from peephole import optimize
 from prd_parser import Parser
 
-sys.setrecursionlimit(1000)
-
-parser = Parser(grammar_rules)
+# --no-tree: production compiles, parse_tree.txt is not written and no tree is built
+# --profile: calls, time and PB writes of every semantic routine go to codegen_profile.txt
+# --optimize: constant expressions are folded, temps are reused, functions main cannot reach and the initializations of
+#   unused globals are dropped, values dead after a recursive call are not saved around it and the peephole optimizer
+#   rewrites the program block, reporting the instructions saved and the temps on stderr
+# --frames: params and locals are kept in a frame on the stack per call instead of at fixed addresses
+parser = Parser(grammar_rules, engine="table", tree_mode="none" if "--no-tree" in sys.argv[1:] else "stream", profile_codegen="--profile" in sys.argv[1:],
+                fold_constants="--optimize" in sys.argv[1:], reuse_temps="--optimize" in sys.argv[1:], frames="--frames" in sys.argv[1:])
 parser.parse_and_write()
 
+if parser.codegen.profile is not None:
+    with open("codegen_profile.txt", "w") as f:
+        f.write(parser.codegen.profile_report())
+
 with open("semantic_errors.txt", "w") as f:
     has_errors = len(parser.codegen.semantic_errors) > 0
     if has_errors:
@@ -19,20 +29,18 @@ with open("semantic_errors.txt", "w") as f:
     else:
         f.write("The input program is semantically correct.\n")
 
+if "--optimize" in sys.argv[1:] and not has_errors:
+    print(f"optimizer: {optimize(parser.codegen)} instructions saved", file=sys.stderr)
+    print(f"temp reuse: {parser.codegen.temp_count} temps in {len(parser.codegen.temps)} cells", file=sys.stderr)
+
 # print("\n")
+
 with open("output.txt", "w") as f:
     if has_errors:
         f.write("The code has not been generated.\n")
     else:
-        lastline = -1
-        for i, line in enumerate(parser.codegen.PB):
-            if line != None:
-                code = f"{i}\t({', '.join((str(x) if x is not None else ' ') for x in line)} )"
-                #assert lastline == i-1, f"Line {i} is not in order, last line was {lastline}"
-                code = "\n"*(i-lastline-1) + code
-                lastline = i
-                f.write(code + "\n")
-                if parser.codegen.comment[i] != None:
-                    code = f"{code:<40}" #{parser.codegen.comment[i]}
-                print(code)
-
+        for i, code in parser.codegen.PB.listing():
+            f.write(code + "\n")
+            if i in parser.codegen.comment:
+                code = f"{code:<40}" #{parser.codegen.comment[i]}
+            print(code)
@@ -0,0 +1,61 @@
+import bisect
+import locale
+import mmap
+import os
+import re
+
+END_OF_INPUT = chr(0)
+MMAP_THRESHOLD = 1 << 20  # files bigger than this are decoded straight from a memory map
+
+
+class SourceBuffer:
+    """
+    The whole input held in one string with a read cursor.
+    The text always ends with a single END_OF_INPUT char; anything after an embedded one is dropped.
+    """
+    def __init__(self, text: str):
+        end = text.find(END_OF_INPUT)
+        if end != -1:
+            text = text[:end]
+        self.text = text + END_OF_INPUT
+        self.position = 0
+        self.scanned = 0  # how far the text has been read, chars that were given back included
+        self.newlines = [match.start() for match in re.finditer("\n", self.text)]
+
+    def read_char(self) -> str:
+        ch = self.text[self.position]
+        self.position += 1
+        if self.position > self.scanned:
+            self.scanned = self.position
+        return ch
+
+    def unread(self, count: int = 1):
+        self.position -= count
+
+    def slice(self, begin: int, end: int) -> str:
+        return self.text[begin:end]
+
+    def line_at(self, offset: int) -> int:
+        """line number after reading text[:offset]"""
+        return bisect.bisect_left(self.newlines, offset) + 1
+
+    @property
+    def lineno(self) -> int:
+        return self.line_at(self.scanned)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.scanned == len(self.text)
+
+
+def read_source(filename: str = "input.txt") -> SourceBuffer:
+    if os.path.getsize(filename) < MMAP_THRESHOLD:
+        with open(filename, "r") as file:
+            return SourceBuffer(file.read())
+
+    # decode from the mapped pages, skipping the intermediate bytes copy of file.read()
+    with open(filename, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        text = str(mapped, locale.getpreferredencoding(False))
+    if "\r" in text:  # same universal newlines translation as text mode
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return SourceBuffer(text)
@@ -1,54 +1,85 @@
-
 from contextlib import contextmanager
 
+FLUSH_POLICIES = ["write", "line", "bytes", "end"]
+FLUSH_BYTES = 1 << 16
+
 
 @contextmanager
-def base_file_writer(filename: str):
-    last_lineno = 0
+def buffered_file_writer(filename: str, flush_policy: str = "write", flush_bytes: int = FLUSH_BYTES):
+    """
+    Collects the written strings in memory and hands them to the file in one chunk, when the flush policy says so:
+    after every write, after every completed line, once flush_bytes are buffered, or only at the end.
+    """
+    assert flush_policy in FLUSH_POLICIES, f"Unknown flush policy {flush_policy}"
+    chunks = []
+    size = 0
     with open(filename, "w") as file:
+        def flush():
+            nonlocal size
+            file.write("".join(chunks))
+            file.flush()
+            chunks.clear()
+            size = 0
+
+        def write(content: str):
+            nonlocal size
+            chunks.append(content)
+            if flush_policy == "bytes":
+                size += len(content.encode(file.encoding))  # what the file will take, not the characters
+            if flush_policy == "write" or (flush_policy == "line" and "\n" in content) or (flush_policy == "bytes" and size >= flush_bytes):
+                flush()
+
+        try:
+            yield write
+        finally:
+            flush()
+
+@contextmanager
+def base_file_writer(filename: str, flush_policy: str = "write"):
+    last_lineno = 0
+    with buffered_file_writer(filename, flush_policy) as write:
         def write_to_file(content: str, lineno: int):
             nonlocal last_lineno
             if lineno != last_lineno:
                 if last_lineno != 0:
-                    file.write("\n")
-                file.write(f"{lineno}.\t")
-            file.write(content)
-            file.flush()
+                    write("\n")
+                write(f"{lineno}.\t")
+            write(content)
             last_lineno = lineno
 
-        yield file, write_to_file
+        yield write, write_to_file
 
 @contextmanager
-def token_file_writer():
-    with base_file_writer("tokens.txt") as (file, file_writer):
+def token_file_writer(flush_policy: str = "write"):
+    with base_file_writer("tokens.txt", flush_policy) as (write, file_writer):
         def write_token_to_file(token, lineno: int):
             file_writer(f"{token} ", lineno)
 
         yield write_token_to_file
-        file.write("\n")
+        write("\n")
 
 @contextmanager
-def lexical_error_file_writer():
+def lexical_error_file_writer(flush_policy: str = "write"):
     no_error = True
-    with base_file_writer("lexical_errors.txt") as (file, file_writer):
+    with base_file_writer("lexical_errors.txt", flush_policy) as (write, file_writer):
         def write_error_to_file(error_type, message: str, lineno: int):
             nonlocal no_error
             no_error = False
             file_writer(f"({message}, {error_type}) ", lineno)
 
         yield write_error_to_file
-        file.write("There is no lexical error." if no_error else "\n")
+        write("There is no lexical error." if no_error else "\n")
 
 @contextmanager
-def syntax_error_file_writer():
+def syntax_error_file_writer(flush_policy: str = "end"):
     no_error = True
-    with open("syntax_errors.txt", "w") as file:
+    with buffered_file_writer("syntax_errors.txt", flush_policy) as write:
         def report_syntax_error(message: str, lineno: int):
             nonlocal no_error
             if not no_error:
-                file.write("\n")
+                write("\n")
             no_error = False
-            file.write(f"#{lineno} : syntax error, {message}")
+            write(f"#{lineno} : syntax error, {message}")
 
         yield report_syntax_error
-        file.write("There is no syntax error." if no_error else "")
+        write("There is no syntax error." if no_error else "")
@@ -1,12 +1,14 @@
-from typing import Dict, List, Set
+from collections import deque
+from typing import Dict, List, Set, Tuple
 
 from parser_constants import *
 
 
 class FirstFollowCalculator:
     def __init__(self, rules: List[GRAMMAR_RULE]):
+        non_terminals = {left for left, _ in rules}  # not just NonTerminal members, so synthetic grammars work too
         self.rules = [
-            (left, [i for i in right if isinstance(i, Terminal) or isinstance(i, NonTerminal)]) 
+            (left, [i for i in right if isinstance(i, Terminal) or i in non_terminals]) 
             for left, right in rules
         ]
         self.first_sets: Dict[NonTerminal, Set[Terminal]] = {non_terminal: set() for non_terminal, _ in self.rules}
@@ -18,7 +20,7 @@ class FirstFollowCalculator:
         eps = False
 
         for index, item in enumerate(items):
-            if isinstance(item, NonTerminal):
+            if item in self.first_sets:
                 filtered = self.first_sets[item] - {EPSILON}
                 result = result.union(filtered)
 
@@ -58,7 +60,7 @@ class FirstFollowCalculator:
 
             for left, right in self.rules:
                 for index, item in enumerate(right):
-                    if not isinstance(item, NonTerminal):
+                    if item not in self.follow_sets:
                         continue
 
                     set_accum = self.follow_sets[item]
@@ -77,7 +79,7 @@ class FirstFollowCalculator:
         for rule_index, (left, right) in enumerate(self.rules):
             set_accum = set()
 
-            if isinstance(right[0], NonTerminal):
+            if right[0] in self.follow_sets:
                 set_accum = set_accum.union(self.collect_set(set_accum, right, self.follow_sets[left]))
             elif right[0] == EPSILON:
                 set_accum = self.follow_sets[left]
@@ -89,6 +91,112 @@ class FirstFollowCalculator:
         return self.predict_sets
 
 
+EPSILON_BIT = 1 << TERMINAL_IDS[EPSILON]
+
+class BitsetFirstFollowCalculator:
+    """
+    The sets of FirstFollowCalculator, with every set of terminals held as an int whose bit i is TERMINALS[i].
+    Instead of sweeping all rules until nothing changes, a rule's FIRST is re-evaluated only when the FIRST of a
+    non-terminal in it grew, and a FOLLOW set is propagated only to the ones including it when it grew.
+    LL(1) conflicts (two rules of a non-terminal with overlapping predict sets) are collected with the predict sets.
+    """
+    def __init__(self, rules: List[GRAMMAR_RULE]):
+        self.non_terminals = list(dict.fromkeys(left for left, _ in rules))
+        index = {non_terminal: i for i, non_terminal in enumerate(self.non_terminals)}
+        # a non-terminal is its index, a terminal is ~TERMINAL_IDS[terminal] so that it is negative
+        self.rules: List[Tuple[int, List[int]]] = [
+            (index[left], [index[i] if i in index else ~TERMINAL_IDS[i] for i in right if i in index or isinstance(i, Terminal)])
+            for left, right in rules
+        ]
+        self.first_bits = [0] * len(self.non_terminals)
+        self.follow_bits = [0] * len(self.non_terminals)
+        self.predict_bits: List[int] = []
+        self.conflicts: List[Tuple[NonTerminal, int, int, Set[Terminal]]] = []  # (non-terminal, earlier rule, rule, shared terminals)
+
+    @staticmethod
+    def decode(bits: int) -> Set[Terminal]:
+        return {terminal for i, terminal in enumerate(TERMINALS) if bits >> i & 1}
+
+    def sequence_first(self, symbols: List[int]) -> int:
+        """FIRST of a sequence of symbols, with EPSILON_BIT if all of them can derive epsilon"""
+        bits = 0
+        for symbol in symbols:
+            if symbol < 0:
+                return bits | 1 << ~symbol
+            bits |= self.first_bits[symbol] & ~EPSILON_BIT
+            if not self.first_bits[symbol] & EPSILON_BIT:
+                return bits
+        return bits | EPSILON_BIT
+
+    def calculate_first_sets(self) -> Dict[NonTerminal, Set[Terminal]]:
+        first = self.first_bits
+        users: List[List[int]] = [[] for _ in self.non_terminals]  # rules to re-evaluate when the FIRST of a non-terminal grows
+        for rule_index, (_, right) in enumerate(self.rules):
+            for symbol in set(right):
+                if symbol >= 0:
+                    users[symbol].append(rule_index)
+
+        worklist = deque(range(len(self.rules)))
+        queued = [True] * len(self.rules)
+        while worklist:
+            rule_index = worklist.popleft()
+            queued[rule_index] = False
+            left, right = self.rules[rule_index]
+            bits = first[left] | self.sequence_first(right)
+            if bits != first[left]:
+                first[left] = bits
+                for user in users[left]:
+                    if not queued[user]:
+                        queued[user] = True
+                        worklist.append(user)
+        return {non_terminal: self.decode(first[i]) for i, non_terminal in enumerate(self.non_terminals)}
+
+    def calculate_follow_sets(self) -> Dict[NonTerminal, Set[Terminal]]:
+        follow = self.follow_bits
+        follow[self.rules[0][0]] |= 1 << TERMINAL_IDS[EOF]
+        includers: List[Set[int]] = [set() for _ in self.non_terminals]  # includers[a] has b if FOLLOW(b) includes FOLLOW(a)
+        for left, right in self.rules:
+            for position, symbol in enumerate(right):
+                if symbol < 0:
+                    continue
+                bits = self.sequence_first(right[position + 1:])
+                follow[symbol] |= bits & ~EPSILON_BIT
+                if bits & EPSILON_BIT and symbol != left:
+                    includers[left].add(symbol)
+
+        worklist = deque(range(len(self.non_terminals)))
+        queued = [True] * len(self.non_terminals)
+        while worklist:
+            non_terminal = worklist.popleft()
+            queued[non_terminal] = False
+            for includer in includers[non_terminal]:
+                bits = follow[includer] | follow[non_terminal]
+                if bits != follow[includer]:
+                    follow[includer] = bits
+                    if not queued[includer]:
+                        queued[includer] = True
+                        worklist.append(includer)
+        return {non_terminal: self.decode(follow[i]) for i, non_terminal in enumerate(self.non_terminals)}
+
+    def calculate_predict_sets(self) -> List[Set[Terminal]]:
+        rules_of: List[List[int]] = [[] for _ in self.non_terminals]
+        for rule_index, (left, right) in enumerate(self.rules):
+            bits = self.sequence_first(right)
+            if bits & EPSILON_BIT:
+                bits = bits & ~EPSILON_BIT | self.follow_bits[left]
+            for other in rules_of[left]:
+                if self.predict_bits[other] & bits:
+                    self.conflicts.append((self.non_terminals[left], other, rule_index, self.decode(self.predict_bits[other] & bits)))
+            rules_of[left].append(rule_index)
+            self.predict_bits.append(bits)
+        return [self.decode(bits) for bits in self.predict_bits]
+
+    def conflict_messages(self) -> List[str]:
+        return [
+            f"LL(1) conflict in {non_terminal}: rules {rule_index} and {other_index} both predict {sorted(map(str, terminals))}"
+            for non_terminal, rule_index, other_index, terminals in self.conflicts
+        ]
+
 
 if __name__ == '__main__':
     calculator = FirstFollowCalculator(grammar_rules)
@@ -99,4 +207,11 @@ if __name__ == '__main__':
     from pprint import pprint
     pprint(calculator.first_sets)
     pprint(calculator.follow_sets)
-    pprint(calculator.predict_sets)
\ No newline at end of file
+    pprint(calculator.predict_sets)
+
+    bitset_calculator = BitsetFirstFollowCalculator(grammar_rules)
+    assert bitset_calculator.calculate_first_sets() == calculator.first_sets
+    assert bitset_calculator.calculate_follow_sets() == calculator.follow_sets
+    assert bitset_calculator.calculate_predict_sets() == calculator.predict_sets
+    for message in bitset_calculator.conflict_messages():
+        print(message)
\ No newline at end of file
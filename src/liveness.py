@@ -0,0 +1,78 @@
+from typing import Dict, Iterable, List, Set, Tuple
+
+from program_block import ARITHMETIC
+
+
+class SpillLiveness:
+    """
+    Liveness of the values saved on the stack around recursive calls, over a finished program block: which of them
+    may be read after the call before they are written again. Control goes from a call to its return address, the
+    callee keeping what it needs itself, and stops at a JP through an address, a return. An indirect operand reads
+    the address it holds and reaches an array element, never a saved value. A save only reads its value if the save
+    is kept, that is if the value is live after its call, so the analysis starts with nothing live and grows to the
+    least solution.
+    """
+    def __init__(self, instructions: List[list], return_address_instructions: Iterable[int], spills: List[Tuple[int, int, int]]):
+        self.instructions = instructions
+        self.spills = spills  # (PB index of the save, of the restore, of the code after the call)
+        self.addresses = {instructions[save][1] for save, _, _ in spills}
+        self.saves: Dict[int, int] = {save: after for save, _, after in spills}
+        calls = {index + 1: int(instructions[index][1][1:]) for index in return_address_instructions}
+        self.successors: List[List[int]] = []
+        for index, instruction in enumerate(instructions):
+            if index in calls:
+                self.successors.append([calls[index]])
+            elif instruction[0] == "JP":
+                self.successors.append([instruction[1]] if type(instruction[1]) is int else [])
+            elif instruction[0] == "JPF":
+                self.successors.append([index + 1, instruction[2]])
+            else:
+                self.successors.append([index + 1])
+
+    def effects(self, instruction: list) -> Tuple[Set[int], Set[int]]:
+        """the tracked addresses an instruction reads and writes"""
+        opcode = instruction[0]
+        read_positions = {1, 2} if opcode in ARITHMETIC else {1} if opcode in ("ASSIGN", "PRINT", "JPF") else set()
+        write_position = 3 if opcode in ARITHMETIC else 2 if opcode == "ASSIGN" else None
+        reads, writes = set(), set()
+        for position, operand in enumerate(instruction[1:], 1):
+            if type(operand) is str and operand.startswith("@"):
+                address = int(operand[1:])
+                if address in self.addresses:
+                    reads.add(address)
+            elif type(operand) is int and operand in self.addresses:
+                if position in read_positions:
+                    reads.add(operand)
+                elif position == write_position:
+                    writes.add(operand)
+        return reads, writes
+
+    def solve(self) -> List[Set[int]]:
+        """the tracked addresses live into each instruction, and an empty set for the end of the program"""
+        effects = [self.effects(instruction) for instruction in self.instructions]
+        live: List[Set[int]] = [set() for _ in range(len(self.instructions) + 1)]
+        changed = True
+        while changed:
+            changed = False
+            for index in range(len(self.instructions) - 1, -1, -1):
+                live_out = set().union(*(live[successor] for successor in self.successors[index]))
+                reads, writes = effects[index]
+                if index in self.saves:
+                    address = self.instructions[index][1]
+                    reads = {address} if address in live[self.saves[index]] else set()
+                live_in = (live_out - writes) | reads
+                if live_in != live[index]:
+                    live[index] = live_in
+                    changed = True
+        return live
+
+    def dead_spills(self) -> Set[int]:
+        """the PB indices of the saves and restores of values not live after their call, two instructions each"""
+        if not self.spills:
+            return set()
+        live = self.solve()
+        dead = set()
+        for save, restore, after in self.spills:
+            if self.instructions[save][1] not in live[after]:
+                dead.update((save, save + 1, restore, restore + 1))
+        return dead
@@ -0,0 +1,222 @@
+import locale
+import os
+from array import array
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from parser_constants import *
+
+
+END_TERMINAL_ID = TERMINAL_IDS[EOF]
+
+
+class ParseTree:
+    """
+    Arena of parse tree nodes, kept in parallel arrays indexed by node id instead of one object per node.
+    A node has a kind, a label (NON_TERMINALS index of a non-terminal, TERMINALS index of a token), its first child
+    and its next sibling (-1 if none), and for tokens the index of the Token in self.tokens.
+    Nodes are added bottom-up, children before their parent; the parser does it through the events
+    open, leaf, epsilon, missing and close, which ParseTreeWriter takes as well.
+    """
+    NON_TERMINAL = 0
+    TOKEN = 1
+    EPSILON = 2
+    END = 3  # the matched "$"
+
+    def __init__(self):
+        self.kind = array("b")
+        self.label = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.token = array("i")
+        self.tokens = []
+        # epsilon is always an only child, so one leaf (with no sibling) serves every epsilon production
+        self.epsilon_leaf = self.add(ParseTree.EPSILON)
+        self.open_nodes: List[Tuple[Optional[NonTerminal], List[int]]] = [(None, [])]  # the first one holds the root
+
+    def __len__(self):
+        return len(self.kind)
+
+    def add(self, kind: int, label: int = -1, token=None) -> int:
+        node = len(self.kind)
+        self.kind.append(kind)
+        self.label.append(label)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        if token is None:
+            self.token.append(-1)
+        else:
+            self.token.append(len(self.tokens))
+            self.tokens.append(token)
+        return node
+
+    def add_token(self, token) -> int:
+        return self.add(ParseTree.TOKEN, token.terminal_id, token)
+
+    def add_end(self) -> int:
+        return self.add(ParseTree.END)
+
+    def add_non_terminal(self, non_terminal: NonTerminal, children: List[int]) -> int:
+        node = self.add(ParseTree.NON_TERMINAL, NON_TERMINAL_IDS[non_terminal])
+        if children:
+            self.first_child[node] = children[0]
+            for child, sibling in zip(children, children[1:]):
+                self.next_sibling[child] = sibling
+        return node
+
+    def add_epsilon_production(self, non_terminal: NonTerminal) -> int:
+        return self.add_non_terminal(non_terminal, [self.epsilon_leaf])
+
+    @property
+    def root(self) -> Optional[int]:
+        roots = self.open_nodes[0][1]
+        return roots[0] if roots else None
+
+    def open(self, non_terminal: NonTerminal, size: int):
+        """non_terminal is expanded with a rule of size terminals and non-terminals"""
+        self.open_nodes.append((non_terminal, []))
+
+    def leaf(self, token):
+        node = self.add_end() if token.terminal_id == END_TERMINAL_ID else self.add_token(token)
+        self.open_nodes[-1][1].append(node)
+
+    def epsilon(self, non_terminal: NonTerminal):
+        self.open_nodes[-1][1].append(self.add_epsilon_production(non_terminal))
+
+    def missing(self):
+        """a symbol of the open rule gave no node"""
+
+    def close(self):
+        non_terminal, children = self.open_nodes.pop()
+        self.open_nodes[-1][1].append(self.add_non_terminal(non_terminal, children))
+
+    def close_all(self):
+        """closes the open nodes with what they have, when the parse stops early"""
+        while len(self.open_nodes) > 1:
+            self.close()
+
+    def children(self, node: int) -> Iterator[int]:
+        child = self.first_child[node]
+        while child != -1:
+            yield child
+            child = self.next_sibling[child]
+
+    def name(self, node: int) -> str:
+        """the text of the node in parse_tree.txt"""
+        kind = self.kind[node]
+        if kind == ParseTree.NON_TERMINAL:
+            return str(NON_TERMINALS[self.label[node]])
+        if kind == ParseTree.TOKEN:
+            return str(self.tokens[self.token[node]])
+        return "epsilon" if kind == ParseTree.EPSILON else "$"
+
+    def walk(self, root: int) -> Iterator[Tuple[int, int]]:
+        """(node, depth) in pre-order, without recursing once per tree level"""
+        stack = [(root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            yield node, depth
+            stack.extend((child, depth + 1) for child in reversed(list(self.children(node))))
+
+    def render(self, root: Optional[int]) -> str:
+        """same text as anytree.RenderTree(self.to_anytree(root)).by_attr(), i.e. parse_tree.txt; empty if the parse stopped before the root"""
+        if root is None:
+            return ""
+        lines = []
+        stack = [(root, "", "")]
+        while stack:
+            node, prefix, children_prefix = stack.pop()
+            lines.append(prefix + self.name(node))
+            children = list(self.children(node))
+            for index in range(len(children) - 1, -1, -1):
+                if index == len(children) - 1:
+                    stack.append((children[index], children_prefix + "└── ", children_prefix + "    "))
+                else:
+                    stack.append((children[index], children_prefix + "├── ", children_prefix + "│   "))
+        return "\n".join(lines)
+
+    def to_anytree(self, root: Optional[int]):
+        """the tree as anytree nodes named like parse_tree.txt, for code that still wants them"""
+        import anytree  # only needed here, so the compiler does not import it on every start
+
+        if root is None:
+            return None
+        anytree_root = anytree.Node(self.name(root))
+        stack = [(root, anytree_root)]
+        while stack:
+            node, anytree_node = stack.pop()
+            children = [anytree.Node(self.name(child)) for child in self.children(node)]
+            anytree_node.children = children
+            stack.extend(zip(self.children(node), children))
+        return anytree_root
+
+
+class ParseTreeWriter:
+    """
+    Writes parse_tree.txt while the parser sends the events of ParseTree, keeping one frame per open node.
+    Whether a node is the last child of its parent decides its lines, but is only known once the symbols after it
+    in the rule gave nodes or not. A node is written as last iff nothing follows it in the rule; that guess is only
+    wrong when every later symbol is missing, a syntax error, and then the node's lines are read back from the file
+    and rewritten with the column of the parent changed.
+    """
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.encoding = locale.getpreferredencoding(False)  # the encoding and newlines of a text mode file
+        self.newline = os.linesep
+        # per open node: [prefix of its children's lines, symbols left in its rule, offset of its last child, was that child written as last]
+        self.frames = [[None, 1, -1, True]]  # the root has no prefix
+
+    def write_node(self, name: str) -> str:
+        """writes the line of a child of the innermost open node, returns the prefix for the lines of its children"""
+        frame = self.frames[-1]
+        frame[1] -= 1
+        last = frame[1] == 0
+        if frame[0] is None:
+            line, children_prefix = name, ""
+        else:
+            line = frame[0] + ("└── " if last else "├── ") + name
+            children_prefix = frame[0] + ("    " if last else "│   ")
+        offset = self.file.tell()
+        if offset:
+            self.file.write(self.newline.encode(self.encoding))
+            offset = self.file.tell()
+        self.file.write(line.encode(self.encoding))
+        frame[2], frame[3] = offset, last
+        return children_prefix
+
+    def rewrite_as_last(self, frame: list):
+        column = len(frame[0])
+        self.file.seek(frame[2])
+        lines = self.file.read().decode(self.encoding).split(self.newline)
+        lines[0] = lines[0][:column] + "└── " + lines[0][column + 4:]
+        for index in range(1, len(lines)):
+            lines[index] = lines[index][:column] + "    " + lines[index][column + 4:]
+        self.file.seek(frame[2])
+        self.file.write(self.newline.join(lines).encode(self.encoding))
+        self.file.truncate()
+        frame[3] = True
+
+    def open(self, non_terminal: NonTerminal, size: int):
+        self.frames.append([self.write_node(str(non_terminal)), size, -1, True])
+
+    def leaf(self, token):
+        self.write_node("$" if token.terminal_id == END_TERMINAL_ID else str(token))
+
+    def epsilon(self, non_terminal: NonTerminal):
+        self.open(non_terminal, 1)
+        self.write_node("epsilon")
+        self.close()
+
+    def missing(self):
+        frame = self.frames[-1]
+        frame[1] -= 1
+        if frame[1] == 0 and not frame[3]:
+            self.rewrite_as_last(frame)
+
+    def close(self):
+        self.frames.pop()
+
+    def close_all(self):
+        while len(self.frames) > 1:
+            while self.frames[-1][1] > 0:
+                self.missing()
+            self.close()
@@ -1,8 +1,8 @@
 import enum
-from typing import List, Tuple, Union
+from typing import Dict, List, Tuple, Union
 from code_gen import SemanticRoutine
 
-__all__ = ['NonTerminal', 'Terminal', 'GRAMMAR_RHS', 'GRAMMAR_RULE', 'EPSILON', 'EOF', 'grammar_rules']
+__all__ = ['NonTerminal', 'Terminal', 'TERMINALS', 'TERMINAL_IDS', 'NON_TERMINALS', 'NON_TERMINAL_IDS', 'GRAMMAR_RHS', 'GRAMMAR_RULE', 'EPSILON', 'EOF', 'grammar_rules']
 
 class NonTerminal(enum.Enum):
     Program = 'Program'
@@ -108,6 +108,11 @@ class Terminal(enum.Enum):
                 return terminal
         assert 0, f"Terminal with name {name} not found"
 
+TERMINALS: Tuple[Terminal, ...] = tuple(Terminal)  # terminal id -> Terminal
+TERMINAL_IDS: Dict[Terminal, int] = {terminal: terminal_id for terminal_id, terminal in enumerate(TERMINALS)}
+NON_TERMINALS: Tuple[NonTerminal, ...] = tuple(NonTerminal)  # non-terminal id -> NonTerminal
+NON_TERMINAL_IDS: Dict[NonTerminal, int] = {non_terminal: non_terminal_id for non_terminal_id, non_terminal in enumerate(NON_TERMINALS)}
+
 GRAMMAR_RHS = List[Union[NonTerminal, Terminal]]
 GRAMMAR_RULE = Tuple[NonTerminal, GRAMMAR_RHS]
 EPSILON = Terminal.EPSILON
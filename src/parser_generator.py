@@ -0,0 +1,147 @@
+import zlib
+from types import ModuleType
+from typing import Dict, List, Optional
+
+from code_gen import SemanticRoutine
+from parser_constants import *
+from table_cache import cached_module
+
+
+class ParserGenerator:
+    """
+    Writes the recursive descent parser of a grammar as Python source: one function per non-terminal that checks
+    the terminal id of the lookahead against the rules' predict sets with integer comparisons and runs the chosen
+    rule body inline, calling the CodeGen routines directly. It makes the same calls on the Parser and its tree
+    as the procedures of Parser.create_procedure, and leaves errors and panic mode recovery to Parser.predict and
+    Parser.match_procedure, so it only adds speed.
+    """
+    def __init__(self, rules: List[GRAMMAR_RULE], parse_table: Dict[NonTerminal, List[Optional[int]]], rule_sizes: List[int]):
+        self.rules = rules  # with the EOF of the first rule, like Parser.rules
+        self.parse_table = parse_table
+        self.rule_sizes = rule_sizes
+        self.lines: List[str] = []
+
+    def emit(self, indent: int, line: str):
+        self.lines.append("    " * indent + line)
+
+    @staticmethod
+    def function_name(non_terminal: NonTerminal) -> str:
+        return f"parse_{non_terminal.name}"
+
+    @staticmethod
+    def routine_name(routine: SemanticRoutine) -> str:
+        return str(routine).replace('#', 'semantic_routine__')
+
+    @staticmethod
+    def condition(terminal_ids: List[int]) -> str:
+        if len(terminal_ids) <= 2:
+            return " or ".join(f"terminal_id == {terminal_id}" for terminal_id in terminal_ids)
+        return f"terminal_id in {{{', '.join(map(str, terminal_ids))}}}"
+
+    def generate(self) -> str:
+        routines = sorted({symbol for _, rhs in self.rules for symbol in rhs if isinstance(symbol, SemanticRoutine)}, key=self.routine_name)
+        self.lines = [
+            "# generated by parser_generator.py from the grammar, do not edit",
+            "from code_gen import SemanticRoutine",
+            "from parser_constants import NonTerminal, Terminal",
+            "",
+            "",
+            "def build(parser):",
+            "    \"\"\"the parse function of Program, bound to parser, its codegen and its tree\"\"\"",
+            "    codegen = parser.codegen",
+            "    tree = parser.tree",
+            "    get_lookahead_token = parser.get_lookahead_token",
+            "    discard_lookahead = parser.discard_lookahead",
+            "    match_procedure = parser.match_procedure",
+            "    predict = parser.predict",
+        ]
+        for routine in routines:
+            self.emit(1, f"{self.routine_name(routine)} = codegen.routines[SemanticRoutine.{routine.name}]")
+        for non_terminal in NonTerminal:
+            self.emit(0, "")
+            self.generate_function(non_terminal)
+        self.emit(0, "")
+        self.emit(1, f"return {self.function_name(NonTerminal.Program)}")
+        return "\n".join(self.lines)
+
+    def generate_function(self, non_terminal: NonTerminal):
+        self.emit(1, f"def {self.function_name(non_terminal)}():")
+        self.emit(2, "token = parser.lookahead or get_lookahead_token()")
+        self.emit(2, "if token is None:")
+        self.emit(3, "return False")
+        self.emit(2, "terminal_id = token.terminal_id")
+        terminal_ids: Dict[int, List[int]] = {}
+        for terminal_id, rule_id in enumerate(self.parse_table[non_terminal]):
+            if rule_id is not None:
+                terminal_ids.setdefault(rule_id, []).append(terminal_id)
+        # only generate_action reads it
+        if any(isinstance(symbol, SemanticRoutine) for rule_id in terminal_ids for symbol in self.rules[rule_id][1]):
+            self.emit(2, "lineno = token.lineno")
+        for rule_id in sorted(terminal_ids):
+            self.emit(2, f"if {self.condition(terminal_ids[rule_id])}:")
+            self.generate_rule(rule_id, 3)
+            self.emit(3, "return True")
+        # no rule for the lookahead: predict reports and skips tokens until one syncs the parse, which dispatches again
+        self.emit(2, f"if predict(NonTerminal.{non_terminal.name}) is None:")
+        self.emit(3, "return False")
+        self.emit(2, f"return {self.function_name(non_terminal)}()")
+
+    def generate_rule(self, rule_id: int, indent: int):
+        non_terminal, rhs = self.rules[rule_id]
+        if Terminal.EPSILON in rhs:
+            for symbol in rhs:
+                if isinstance(symbol, SemanticRoutine):
+                    self.generate_action(symbol, indent)
+            self.emit(indent, "if tree is not None:")
+            self.emit(indent + 1, f"tree.epsilon(NonTerminal.{non_terminal.name})")
+            return
+        self.emit(indent, "if tree is not None:")
+        self.emit(indent + 1, f"tree.open(NonTerminal.{non_terminal.name}, {self.rule_sizes[rule_id]})")
+        for symbol in rhs:
+            if isinstance(symbol, SemanticRoutine):
+                self.generate_action(symbol, indent)
+            elif isinstance(symbol, NonTerminal):
+                self.emit(indent, f"if not {self.function_name(symbol)}() and tree is not None:")
+                self.emit(indent + 1, "tree.missing()")
+            elif symbol == Terminal.EOF:
+                self.emit(indent, "match_procedure(Terminal.EOF)")
+            else:
+                self.generate_match(symbol, indent)
+        self.emit(indent, "if tree is not None:")
+        self.emit(indent + 1, "tree.close()")
+
+    def generate_action(self, routine: SemanticRoutine, indent: int):
+        # what CodeGen.code_gen does, without looking the routine up
+        self.emit(indent, "codegen._lineno = lineno")
+        self.emit(indent, f"{self.routine_name(routine)}(parser.last_token.token_string if parser.last_token else None)")
+
+    def generate_match(self, terminal: Terminal, indent: int):
+        self.emit(indent, "token = parser.lookahead or get_lookahead_token()")
+        self.emit(indent, f"if token is not None and token.terminal_id == {TERMINAL_IDS[terminal]}:")
+        self.emit(indent + 1, "discard_lookahead()")
+        self.emit(indent + 1, "parser.last_token = token")
+        self.emit(indent + 1, "if tree is not None:")
+        self.emit(indent + 2, "tree.leaf(token)")
+        self.emit(indent, "else:")
+        self.emit(indent + 1, f"match_procedure(Terminal.{terminal.name})")
+
+
+def generated_parser(grammar, rules: List[GRAMMAR_RULE], parse_table: Dict[NonTerminal, List[Optional[int]]], rule_sizes: List[int]) -> ModuleType:
+    """
+    The generated module for the rules, from the cache if it was generated for the same grammar and the same
+    terminal and non-terminal order by this same generator, grammar being the rules by name as Parser has them.
+    """
+    with open(__file__, "rb") as file:
+        generator_hash = zlib.crc32(file.read())
+    # the module compares terminal ids, which are positions in Terminal
+    symbols = ([terminal.name for terminal in TERMINALS], [non_terminal.name for non_terminal in NON_TERMINALS])
+    generator = ParserGenerator(rules, parse_table, rule_sizes)
+    return cached_module("generated_parser", (grammar, symbols, generator_hash), generator.generate)
+
+
+if __name__ == '__main__':
+    # prints the generated parser of grammar_rules
+    from prd_parser import Parser
+
+    parser = Parser([(left, list(right)) for left, right in grammar_rules], tree_mode="none")
+    print(ParserGenerator(parser.rules, parser.parse_table, parser.rule_sizes).generate())
@@ -0,0 +1,189 @@
+from typing import Dict, List, Optional, Set
+
+from liveness import SpillLiveness
+from program_block import ARITHMETIC, ProgramBlock
+from reachability import Reachability
+
+
+class PeepholeOptimizer:
+    """
+    Rewrites a finished program block, in rounds until nothing changes:
+    jump threading (a jump to a JP goes where that JP goes), removal of jumps to the next instruction,
+    redundant move removal (of ASSIGNs to their own source, and of an ASSIGN copying a temp only it reads, the
+    instruction before writing its destination instead), and compare/branch fusion of the EQ x, #0, t / JPF t / JPF x
+    triple of for loops into JPF x / JP. Removed instructions close up and every jump target and return address
+    moves along, so the program prints the same.
+    """
+    def __init__(self, instructions: List[list], temps: Set[int], return_address_instructions: Set[int]):
+        self.instructions = instructions
+        self.temps = temps
+        # instructions ASSIGNing "#n" where n is an instruction address, the return address of a call
+        self.return_address_instructions = return_address_instructions
+        self.removed: Set[int] = set()
+        self.code_addresses: List[int] = []  # of functions, moved along like the jumps to them
+
+    @staticmethod
+    def jump_target_position(instruction: list) -> Optional[int]:
+        if instruction[0] == "JP":
+            return 1
+        if instruction[0] == "JPF":
+            return 2
+        return None
+
+    def targets(self) -> Set[int]:
+        """addresses control can reach other than from the instruction before"""
+        targets = set()
+        for index, instruction in enumerate(self.instructions):
+            position = self.jump_target_position(instruction)
+            if position is not None and type(instruction[position]) is int:
+                targets.add(instruction[position])
+            if index in self.return_address_instructions:
+                targets.add(int(instruction[1][1:]))
+        return targets
+
+    @staticmethod
+    def destination_position(instruction: list) -> Optional[int]:
+        return 3 if instruction[0] in ARITHMETIC else 2 if instruction[0] == "ASSIGN" else None
+
+    def reads(self) -> Dict[int, int]:
+        """
+        how many times the value written to a temp is read, by the index of the instruction writing it: the reads
+        up to the next instruction writing that temp, as a reused temp is only handed out again after the last
+        instruction reading it was written. An indirect operand reads the address it holds.
+        """
+        reads: Dict[int, int] = {}
+        writers: Dict[int, int] = {}  # the last instruction writing each temp
+        for index, instruction in enumerate(self.instructions):
+            opcode = instruction[0]
+            read_positions = {1, 2} if opcode in ARITHMETIC else {1} if opcode in ("ASSIGN", "PRINT", "JPF") else set()
+            for position, operand in enumerate(instruction[1:], 1):
+                if type(operand) is str and operand.startswith("@"):
+                    address = int(operand[1:])
+                elif type(operand) is int and position in read_positions:
+                    address = operand
+                else:
+                    continue
+                if address in writers:
+                    reads[writers[address]] += 1
+            position = self.destination_position(instruction)
+            if position is not None and type(instruction[position]) is int and instruction[position] in self.temps:
+                writers[instruction[position]] = index
+                reads[index] = 0
+        return reads
+
+    def thread_jumps(self) -> bool:
+        changed = False
+        for instruction in self.instructions:
+            position = self.jump_target_position(instruction)
+            if position is None:
+                continue
+            target, seen = instruction[position], set()
+            while type(target) is int and target < len(self.instructions) and target not in seen and self.instructions[target][0] == "JP":
+                seen.add(target)
+                next_target = self.instructions[target][1]
+                if type(next_target) is not int and instruction[0] != "JP":
+                    break  # only a JP can take over an indirect target
+                target = next_target
+            if target != instruction[position]:
+                instruction[position] = target
+                changed = True
+        return changed
+
+    def find_removals(self) -> bool:
+        targets = self.targets()
+        reads = self.reads()
+        instructions = self.instructions
+        index = 0
+        while index < len(instructions):
+            instruction = instructions[index]
+            position = self.jump_target_position(instruction)
+            if (position is not None and instruction[position] == index + 1) or (instruction[0] == "ASSIGN" and instruction[1] == instruction[2]):
+                self.removed.add(index)
+                index += 1
+                continue
+            if index + 1 < len(instructions) and index + 1 not in targets:
+                following = instructions[index + 1]
+                destination = self.destination_position(instruction)
+                temp = instruction[destination] if destination is not None else None
+                if type(temp) is int and temp in self.temps and reads.get(index) == 1 and index not in self.return_address_instructions:
+                    if following[0] == "ASSIGN" and following[1] == temp and index + 1 not in self.return_address_instructions:
+                        instruction[destination] = following[2]
+                        self.removed.add(index + 1)
+                        index += 2
+                        continue
+                    if (instruction[0] == "EQ" and instruction[2] == "#0" and following[0] == "JPF" and following[1] == temp
+                            and index + 2 < len(instructions) and index + 2 not in targets
+                            and instructions[index + 2][0] == "JPF" and instructions[index + 2][1] == instruction[1]):
+                        # t = x == 0 and JPF t jumps when x != 0: JPF x to where the second JPF goes, else JP to the first's target
+                        instructions[index] = ["JPF", instruction[1], instructions[index + 2][2], None]
+                        instructions[index + 1] = ["JP", following[2], None, None]
+                        self.removed.add(index + 2)
+                        index += 3
+                        continue
+            index += 1
+        return bool(self.removed)
+
+    def compact(self):
+        """drops the removed instructions, sending what pointed at one to the next kept instruction"""
+        new_index = []
+        kept = 0
+        for index in range(len(self.instructions) + 1):
+            new_index.append(kept)
+            if index < len(self.instructions) and index not in self.removed:
+                kept += 1
+        instructions, return_address_instructions = [], set()
+        for index, instruction in enumerate(self.instructions):
+            if index in self.removed:
+                continue
+            position = self.jump_target_position(instruction)
+            if position is not None and type(instruction[position]) is int:
+                instruction[position] = new_index[instruction[position]]
+            if index in self.return_address_instructions:
+                instruction[1] = f"#{new_index[int(instruction[1][1:])]}"
+                return_address_instructions.add(len(instructions))
+            instructions.append(instruction)
+        self.instructions = instructions
+        self.return_address_instructions = return_address_instructions
+        self.code_addresses = [new_index[address] for address in self.code_addresses]
+        self.removed = set()
+
+    def optimize(self) -> List[list]:
+        while True:
+            changed = self.thread_jumps()
+            if self.find_removals():
+                self.compact()
+            elif not changed:
+                return self.instructions
+
+
+def optimize(codegen) -> int:
+    """
+    drops the functions main cannot reach, the initializations of unused globals and the saves of dead values around
+    recursive calls, and runs the peephole optimizer on the program block of codegen, moving the code addresses of
+    the functions along; returns how many instructions that saved
+    """
+    instructions = list(codegen.PB)
+    if None in instructions:  # an address left empty, only in programs with errors
+        return 0
+    optimizer = PeepholeOptimizer(instructions, codegen.temps, set(codegen.return_address_instructions))
+    # first the code main cannot reach, and the saves and restores around recursive calls of values not read after the call
+    functions = [(function.code_address, end) for function, end in codegen.functions]
+    unreachable, pruned = Reachability(instructions, functions, codegen.global_initialization_indices).unreachable()
+    kept = []
+    for function, _ in codegen.functions:
+        if function.code_address in pruned:
+            function.code_address = None
+        else:
+            kept.append(function)
+    optimizer.code_addresses = [function.code_address for function in kept]
+    optimizer.removed = unreachable | SpillLiveness(instructions, codegen.return_address_instructions, codegen.spills).dead_spills()
+    optimizer.compact()
+    optimized = optimizer.optimize()
+    for function, address in zip(kept, optimizer.code_addresses):
+        function.code_address = address
+    codegen.PB = ProgramBlock()
+    for index, instruction in enumerate(optimized):
+        codegen.PB[index] = instruction
+    codegen.PB_index = len(optimized)
+    codegen.comment.clear()
+    return len(instructions) - len(optimized)
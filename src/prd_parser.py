@@ -1,56 +1,126 @@
+import inspect
+import os
+import time
+import zlib
 from typing import Callable, Dict, Generator, List, Optional, Tuple
 
-import anytree
-
 from code_gen import CodeGen, SemanticRoutine
+from file_readers import read_source
 from file_writers import syntax_error_file_writer
-from first_follow_calculator import FirstFollowCalculator
+import first_follow_calculator
+from first_follow_calculator import BitsetFirstFollowCalculator
+from parse_tree import ParseTree, ParseTreeWriter
 from parser_constants import *
+from parser_generator import generated_parser
 from scanner import Scanner, Token, TokenType
+from table_cache import cached
+
+
+def token_reader(scanner: Scanner, filename: str = "input.txt") -> Generator[Token, None, None]:
+    scanner.source = read_source(filename)
+    while not scanner.end_of_file:
+        token = scanner.get_next_token()
+        if token.token_type in [TokenType.ID, TokenType.NUM, TokenType.KEYWORD, TokenType.SYMBOL]:
+            yield token
 
+    yield Token(TokenType.EOF, '$', scanner.lineno, TERMINAL_IDS[Terminal.EOF])
 
-def token_reader(scanner: Scanner) -> Generator[Tuple[Token, int], None, None]:
-    with open("input.txt", "r") as scanner.input_file:
-        while not scanner.end_of_file:
-            token, lineno = scanner.get_next_token()
-            if token.token_type in [TokenType.ID, TokenType.NUM, TokenType.KEYWORD, TokenType.SYMBOL]:
-                yield token, lineno
+class ParseAborted(Exception):
+    """the parser ran out of its error count or time budget"""
+    def __init__(self, reason: str, lineno: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.lineno = lineno
 
-    yield Token(TokenType.EOF, '$'), scanner.lineno
+class GrammarConflict(Exception):
+    """the rules are not LL(1), two rules of a non-terminal predict the same terminal"""
+    def __init__(self, messages: List[str]):
+        super().__init__("\n".join(messages))
+        self.messages = messages
+
+# kinds of the entries on the table engine's parse stack
+EXPAND, MATCH, ACTION, REDUCE = range(4)
+
+def table_builder_hash() -> int:
+    """crc32 of the code computing the grammar tables, so that changing it invalidates the cached ones"""
+    with open(first_follow_calculator.__file__, "rb") as file:
+        builder_hash = zlib.crc32(file.read())
+    return zlib.crc32(inspect.getsource(Parser.build_tables).encode(), builder_hash)
 
 class Parser:
-    def __init__(self, rules: List[GRAMMAR_RULE]):
+    # generated: the recursive engine as a module written by ParserGenerator, table: an explicit stack, for any nesting depth
+    engines = ["recursive", "table", "generated"]
+    # arena: build a ParseTree and render it at the end, stream: write parse_tree.txt while parsing, none: only run the semantic routines
+    tree_modes = ["arena", "stream", "none"]
+
+    def __init__(self, rules: List[GRAMMAR_RULE], scanner_backend: str = "dfa", engine: str = "recursive", tree_mode: str = "arena",
+                 max_errors: Optional[int] = None, time_budget: Optional[float] = None, profile_codegen: bool = False,
+                 fold_constants: bool = False, reuse_temps: bool = False, frames: bool = False):
+        assert engine in Parser.engines, f"Unknown parser engine {engine}"
+        assert tree_mode in Parser.tree_modes, f"Unknown tree mode {tree_mode}"
         self.rules = rules
-        self.scanner = Scanner(ignore_errors=True)
+        self.engine = engine
+        self.tree_mode = tree_mode
+        self.scanner = Scanner(ignore_errors=True, backend=scanner_backend)
         self.token_generator = token_reader(self.scanner)
         self.lookahead = None
         self.last_token = None
         self.procedures: Dict[NonTerminal, Callable] = {}
         self.eof = False
+        # parsing stops after max_errors syntax errors or time_budget seconds, None for no limit
+        self.max_errors = max_errors
+        self.time_budget = time_budget
+        self.error_count = 0
+        self.deadline: Optional[float] = None
         
-        first_follow_calculator = FirstFollowCalculator(rules)
-        self.first_sets = first_follow_calculator.calculate_first_sets()
-        self.follow_sets = first_follow_calculator.calculate_follow_sets()
-        self.predict_sets = first_follow_calculator.calculate_predict_sets()
+        grammar = [(left.name, [f"{type(symbol).__name__}.{symbol.name}" for symbol in right]) for left, right in rules]
+        # the parse table is indexed by terminal ids, which are positions in Terminal, so their order is part of the key
+        symbols = ([terminal.name for terminal in TERMINALS], [non_terminal.name for non_terminal in NON_TERMINALS])
+        self.first_sets, self.follow_sets, self.predict_sets, self.parse_table = cached("grammar", (grammar, symbols, table_builder_hash()), lambda: self.build_tables(rules))
         
         self.rules[0][1].append(Terminal.EOF)
-        
+
+        self.rule_sizes = [sum(not isinstance(symbol, SemanticRoutine) for symbol in rhs) for _, rhs in self.rules]
+        # the rule bodies as parse stack entries, last symbol first
+        self.stack_items: List[List[Tuple[int, object]]] = [
+            [(ACTION if isinstance(symbol, SemanticRoutine) else EXPAND if isinstance(symbol, NonTerminal) else MATCH, symbol) for symbol in reversed(rhs)]
+            for _, rhs in self.rules
+        ]
+
         for non_terminal in NonTerminal:
             self.procedures[non_terminal] = self.create_procedure(non_terminal)
 
-        self.codegen = CodeGen()
+        self.generated_parser = generated_parser(grammar, self.rules, self.parse_table, self.rule_sizes) if engine == "generated" else None
+
+        self.codegen = CodeGen(profile=profile_codegen, fold_constants=fold_constants, reuse_temps=reuse_temps, frames=frames)
+        self.tree = ParseTree() if tree_mode == "arena" else None  # the ParseTreeWriter of stream mode needs the file
+
+    @staticmethod
+    def build_tables(rules: List[GRAMMAR_RULE]):
+        """FIRST, FOLLOW and PREDICT sets and the parse table, saved by table_cache as they only depend on the rules, raises GrammarConflict if the rules are not LL(1)"""
+        first_follow_calculator = BitsetFirstFollowCalculator(rules)
+        first_sets = first_follow_calculator.calculate_first_sets()
+        follow_sets = first_follow_calculator.calculate_follow_sets()
+        predict_sets = first_follow_calculator.calculate_predict_sets()
+        # raised before anything is saved, a table with conflicts would silently pick one of the rules
+        if first_follow_calculator.conflicts:
+            raise GrammarConflict(first_follow_calculator.conflict_messages())
+
+        # parse_table[non_terminal][terminal_id] is the only rule whose predict set has the terminal
+        parse_table: Dict[NonTerminal, List[Optional[int]]] = {non_terminal: [None] * len(TERMINALS) for non_terminal in NonTerminal}
+        for i, (non_terminal, _) in enumerate(rules):
+            for terminal in predict_sets[i]:
+                parse_table[non_terminal][TERMINAL_IDS[terminal]] = i
+        return first_sets, follow_sets, predict_sets, parse_table
 
     def get_lookahead(self, return_lineno=False):
         if self.eof:
             return None
-        token, lineno = self.get_lookahead_token()
-        token_type = token.token_type
-        if token_type in [TokenType.ID, TokenType.NUM, TokenType.EOF]:
-            res = Terminal.with_name(token_type.name)
-        else:
-            res = Terminal.from_str(token.token_string)
+        token = self.get_lookahead_token()
+        assert token.terminal_id is not None, f"Terminal with value {token.token_string} not found"
+        res = TERMINALS[token.terminal_id]
         if return_lineno:
-            return res, lineno
+            return res, token.lineno
         return res
 
     def get_lookahead_token(self):
@@ -61,7 +131,9 @@ class Parser:
         return self.lookahead
 
     def discard_lookahead(self):
-        if self.lookahead[0].token_type == TokenType.EOF:
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise ParseAborted("time budget exceeded", self.lookahead.lineno)
+        if self.lookahead.token_type == TokenType.EOF:
             self.eof = True
         self.lookahead = None
 
@@ -69,78 +141,211 @@ class Parser:
     def error(message: str, lineno: int):
         print(f"#{lineno}: syntax error, {message}")
 
-    @staticmethod
-    def getNode(non_terminal: NonTerminal, children: List[Optional[anytree.Node]]) -> anytree.Node:
-        return anytree.Node(str(non_terminal), children=[child for child in children if child is not None])
+    def syntax_error(self, message: str, lineno: int):
+        self.error(message, lineno)
+        self.error_count += 1
+        if self.max_errors is not None and self.error_count >= self.max_errors:
+            raise ParseAborted("too many syntax errors", lineno)
 
-    def match_procedure(self, terminal: Terminal) -> Optional[anytree.Node]:
-        if self.eof:
-            return None
-        lookahead = self.get_lookahead()
-        token, lineno = self.get_lookahead_token()
-        if lookahead == Terminal.EOF:
-            if lookahead == terminal:
-                return anytree.Node("$")
-            self.error(f"Unexpected EOF", lineno)
-            return None
+    def match(self, terminal: Terminal) -> Optional[Token]:
+        """the matched token, or None if terminal is missing"""
+        while not self.eof:
+            token = self.get_lookahead_token()
+            lookahead = TERMINALS[token.terminal_id] if token.terminal_id is not None else None
+            lineno = token.lineno
+            if lookahead == Terminal.EOF:
+                if lookahead == terminal:
+                    return token
+                self.syntax_error(f"Unexpected EOF", lineno)
+                return None
 
-        if lookahead == terminal:
-            self.discard_lookahead()
-            self.last_token = token
-            return anytree.Node(str(token))
+            if lookahead == terminal:
+                self.discard_lookahead()
+                self.last_token = token
+                return token
 
-        if terminal == Terminal.EOF:
-            if lookahead != terminal:
+            if terminal == Terminal.EOF:
                 self.discard_lookahead()
-                return self.match_procedure(terminal)
-            
-        self.error(f"missing {terminal}", lineno)
+                continue
+
+            self.syntax_error(f"missing {terminal}", lineno)
+            return None
         return None
 
-    def create_procedure(self, non_terminal: NonTerminal):
-        rule_ids = [i for i, rule in enumerate(self.rules) if rule[0] == non_terminal]
-        def procedure() -> Optional[anytree.Node]:
-            if self.eof:
-                return None
-            children = []
-            lookahead, lineno = self.get_lookahead(return_lineno=True)
-            for i in rule_ids:
-                rhs = self.rules[i][1]
-                if lookahead not in self.predict_sets[i]:
-                    continue
-                if Terminal.EPSILON in rhs: # we may have action symbols in the rule, while the rule is epsilon
-                    for symbol in rhs:
-                        if isinstance(symbol, SemanticRoutine):
-                            self.codegen.code_gen(symbol, lineno, self.last_token.token_string if self.last_token else None)
-                    return anytree.Node(str(non_terminal), children=[anytree.Node("epsilon")])
-                for symbol in rhs:
-                    if isinstance(symbol, SemanticRoutine):
-                        self.codegen.code_gen(symbol, lineno, self.last_token.token_string if self.last_token else None)
-                    elif isinstance(symbol, NonTerminal):
-                        children.append(self.procedures[symbol]())  # Call NonTerminal procedure
-                    else:
-                        children.append(self.match_procedure(symbol))  # Match Terminal
-                return self.getNode(non_terminal, children=children)
+    def match_procedure(self, terminal: Terminal):
+        token = self.match(terminal)
+        if self.tree is not None:
+            if token is None:
+                self.tree.missing()
+            else:
+                self.tree.leaf(token)
 
+    def predict(self, non_terminal: NonTerminal) -> Optional[Tuple[int, int]]:
+        """
+        Picks the rule to expand non_terminal with, or recovers in panic mode: illegal tokens are reported and skipped,
+        in a loop, until one in FIRST(non_terminal) ∪ FOLLOW(non_terminal) syncs the parse.
+        Returns the rule id and the line number of the lookahead, or None if non_terminal is missing.
+        """
+        while not self.eof:
+            token = self.get_lookahead_token()
+            if token.terminal_id is None:  # a symbol no terminal stands for, like ':'
+                self.syntax_error(f"illegal {token.token_string}", token.lineno)
+                self.discard_lookahead()
+                continue
+            rule_id = self.parse_table[non_terminal][token.terminal_id]
+            if rule_id is not None:
+                return rule_id, token.lineno
+
+            lookahead = TERMINALS[token.terminal_id]
             if lookahead in self.follow_sets[non_terminal]:
-                self.error(f"missing {non_terminal}", self.get_lookahead_token()[1])
-                #self.discard_lookahead()
+                self.syntax_error(f"missing {non_terminal}", token.lineno)
                 return None
             if lookahead == Terminal.EOF:
-                self.error(f"Unexpected EOF", self.get_lookahead_token()[1])
-                self.discard_lookahead()
-                return procedure()
-            self.error(f"illegal {lookahead}", self.get_lookahead_token()[1])
+                self.syntax_error(f"Unexpected EOF", token.lineno)
+            else:
+                self.syntax_error(f"illegal {lookahead}", token.lineno)
             self.discard_lookahead()
-            return procedure()
+        return None
+
+    def epsilon_actions(self, rhs: GRAMMAR_RHS, lineno: int):
+        # we may have action symbols in the rule, while the rule is epsilon
+        for symbol in rhs:
+            if isinstance(symbol, SemanticRoutine):
+                self.codegen.code_gen(symbol, lineno, self.last_token.token_string if self.last_token else None)
+
+    def create_procedure(self, non_terminal: NonTerminal):
+        def procedure() -> bool:
+            prediction = self.predict(non_terminal)
+            if prediction is None:
+                return False
+            rule_id, lineno = prediction
+            rhs = self.rules[rule_id][1]
+            tree = self.tree
+            if Terminal.EPSILON in rhs:
+                self.epsilon_actions(rhs, lineno)
+                if tree is not None:
+                    tree.epsilon(non_terminal)
+                return True
+            if tree is not None:
+                tree.open(non_terminal, self.rule_sizes[rule_id])
+            for symbol in rhs:
+                if isinstance(symbol, SemanticRoutine):
+                    self.codegen.code_gen(symbol, lineno, self.last_token.token_string if self.last_token else None)
+                elif isinstance(symbol, NonTerminal):
+                    if not self.procedures[symbol]() and tree is not None:  # Call NonTerminal procedure
+                        tree.missing()
+                else:
+                    self.match_procedure(symbol)  # Match Terminal
+            if tree is not None:
+                tree.close()
+            return True
         return procedure
-    
-    def parse(self) -> anytree.Node:
-        return self.procedures[NonTerminal.Program]()
 
-    def parse_and_write(self):
-        with syntax_error_file_writer() as self.error:
-            root = self.parse()
+    def parse_with_table(self):
+        """
+        The same parse as the recursive procedures, driven by an explicit stack instead of the call stack.
+        A REDUCE entry sits under every expanded rule body and closes its node once its children are done.
+        """
+        tree = self.tree
+        stack = [(EXPAND, NonTerminal.Program, None)]
+        while stack:
+            kind, symbol, lineno = stack.pop()
+            if kind == EXPAND:
+                prediction = self.predict(symbol)
+                if prediction is None:
+                    if tree is not None:
+                        tree.missing()
+                    continue
+                rule_id, lineno = prediction
+                rhs = self.rules[rule_id][1]
+                if Terminal.EPSILON in rhs:
+                    self.epsilon_actions(rhs, lineno)
+                    if tree is not None:
+                        tree.epsilon(symbol)
+                    continue
+                if tree is not None:
+                    tree.open(symbol, self.rule_sizes[rule_id])
+                    stack.append((REDUCE, symbol, None))
+                stack.extend((item_kind, item, lineno) for item_kind, item in self.stack_items[rule_id])
+            elif kind == MATCH:
+                self.match_procedure(symbol)
+            elif kind == ACTION:
+                self.codegen.code_gen(symbol, lineno, self.last_token.token_string if self.last_token else None)
+            else:
+                tree.close()
+
+    def parse(self):
+        """parses the input, sending the nodes to self.tree if there is one"""
+        self.deadline = time.monotonic() + self.time_budget if self.time_budget is not None else None
+        try:
+            if self.engine == "table":
+                self.parse_with_table()
+            else:
+                # the generated functions are bound now, as stream mode only sets the tree before parsing
+                program = self.generated_parser.build(self) if self.engine == "generated" else self.procedures[NonTerminal.Program]
+                if not program() and self.tree is not None:
+                    self.tree.missing()
+        except ParseAborted as aborted:
+            self.error(f"{aborted.reason}, parsing aborted", aborted.lineno)
+            if self.tree is not None:
+                self.tree.close_all()
+
+    def parse_and_write(self, flush_policy: str = "end"):
+        if self.tree_mode == "stream":
+            # written aside and moved in place at the end, so a failed compile leaves parse_tree.txt alone like in arena mode
+            try:
+                with open("parse_tree.txt.tmp", "wb+") as f, syntax_error_file_writer(flush_policy) as self.error:
+                    self.tree = ParseTreeWriter(f)
+                    self.parse()
+            except BaseException:
+                os.remove("parse_tree.txt.tmp")
+                raise
+            os.replace("parse_tree.txt.tmp", "parse_tree.txt")
+            return
+
+        with syntax_error_file_writer(flush_policy) as self.error:
+            self.parse()
+
+        if self.tree is not None:
+            with open("parse_tree.txt", "w") as f:
+                f.write(self.tree.render(self.tree.root))
+
+
+if __name__ == '__main__':
+    # differential check: every engine and tree mode must give the recursive engine's tree, syntax errors and program block
+    # usage: python prd_parser.py <input files>
+    import sys
+    import tempfile
+
+    def parse(filename: str, engine: str, tree_mode: str):
+        parser = Parser([(left, list(right)) for left, right in grammar_rules], engine=engine, tree_mode=tree_mode)
+        parser.token_generator = token_reader(parser.scanner, filename)
+        errors = []
+        parser.error = lambda message, lineno: errors.append((lineno, message))
+        tree = None
+        try:
+            if tree_mode == "stream":
+                with tempfile.TemporaryFile() as f:
+                    parser.tree = ParseTreeWriter(f)
+                    parser.parse()
+                    f.seek(0)
+                    tree = f.read().decode(parser.tree.encoding).replace(parser.tree.newline, "\n")
+            else:
+                parser.parse()
+                if tree_mode == "arena":
+                    tree = parser.tree.render(parser.tree.root)
+        except Exception as e:  # code generation is not meant for programs with syntax errors
+            tree = repr(e)
+        return tree, errors, parser.codegen.PB.render(), parser.codegen.semantic_errors
 
-        with open("parse_tree.txt", "w") as f:
-            f.write(anytree.RenderTree(root).by_attr())
+    failed = False
+    for filename in sys.argv[1:]:
+        expected = parse(filename, "recursive", "arena")
+        for engine, tree_mode in [("table", "arena"), ("table", "stream"), ("recursive", "stream"), ("table", "none"),
+                                  ("generated", "arena"), ("generated", "stream"), ("generated", "none")]:
+            result = parse(filename, engine, tree_mode)
+            if result[1:] != expected[1:] or (tree_mode != "none" and result[0] != expected[0]):
+                print(f"{filename}: {engine} engine with {tree_mode} tree differs from recursive with arena")
+                failed = True
+    print(f"{len(sys.argv) - 1} inputs checked, " + ("engines differ" if failed else "all engines agree"))
+    sys.exit(failed)
@@ -0,0 +1,103 @@
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+OPCODES = ["ADD", "MULT", "SUB", "EQ", "LT", "ASSIGN", "JPF", "JP", "PRINT"]
+ARITHMETIC = {"ADD", "SUB", "MULT", "EQ", "LT"}  # read their first two operands and write the third
+EMPTY = -1  # opcode of a slot nothing was written to
+
+# an operand is an int tagged in its 2 low bits with its addressing mode
+DIRECT, IMMEDIATE, INDIRECT, OTHER = range(4)  # 516 or "516", "#4", "@516", anything else (by index in ProgramBlock.others)
+PREFIXES = {"#": IMMEDIATE, "@": INDIRECT}
+OPERAND_LIMIT = 1 << 60  # larger numbers do not fit a tagged 64 bit int and are kept as OTHER
+
+
+class ProgramBlock:
+    """
+    The generated instructions by address, growing as they are written. An instruction is kept as an opcode index
+    and three tagged operands in array columns instead of a list of strings and ints; reading one gives the list back,
+    with direct addresses as ints and immediate and indirect operands as "#n" and "@n" strings.
+    Operands that are none of these, like None or what a semantic error left on the semantic stack, are kept aside
+    in others, so every instruction renders exactly as the list it was written as.
+    """
+    def __init__(self):
+        self.opcodes = array("i")
+        self.operands = (array("q"), array("q"), array("q"))
+        self.others: List[object] = [None]  # None is others[0]
+        self.other_ids: Dict[Tuple[type, object], int] = {(type(None), None): 0}
+        self.opcode_names: List[object] = list(OPCODES)
+        self.opcode_ids: Dict[Tuple[type, object], int] = {(str, name): i for i, name in enumerate(OPCODES)}
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def other(self, value) -> int:
+        key = (type(value), value)
+        if key not in self.other_ids:
+            self.other_ids[key] = len(self.others)
+            self.others.append(value)
+        return self.other_ids[key]
+
+    def encode(self, operand) -> int:
+        if type(operand) is int:
+            number, mode = operand, DIRECT
+        elif type(operand) is str and operand:
+            mode = PREFIXES.get(operand[0], DIRECT)
+            digits = operand if mode == DIRECT else operand[1:]
+            try:
+                number = int(digits)
+            except ValueError:
+                number = None
+            if number is None or str(number) != digits:  # e.g. "#007", which must not come back as "#7"
+                return self.other(operand) << 2 | OTHER
+        else:
+            return self.other(operand) << 2 | OTHER
+        if not -OPERAND_LIMIT <= number < OPERAND_LIMIT:
+            return self.other(operand) << 2 | OTHER
+        return number << 2 | mode
+
+    def decode(self, operand: int):
+        number, mode = operand >> 2, operand & 3
+        if mode == DIRECT:
+            return number
+        if mode == OTHER:
+            return self.others[number]
+        return f"{'#' if mode == IMMEDIATE else '@'}{number}"
+
+    def __setitem__(self, index: int, instruction):
+        if index < 0:
+            raise IndexError(f"program block address {index} is negative")
+        opcode, *operands = instruction
+        key = (type(opcode), opcode)
+        if key not in self.opcode_ids:
+            self.opcode_ids[key] = len(self.opcode_names)
+            self.opcode_names.append(opcode)
+        if index >= len(self.opcodes):
+            missing = index + 1 - len(self.opcodes)
+            self.opcodes.extend(array("i", [EMPTY]) * missing)
+            for column in self.operands:
+                column.extend(array("q", [0]) * missing)
+        self.opcodes[index] = self.opcode_ids[key]
+        for column, operand in zip(self.operands, operands):
+            column[index] = self.encode(operand)
+
+    def __getitem__(self, index: int) -> Optional[list]:
+        opcode = self.opcodes[index]
+        if opcode == EMPTY:
+            return None
+        return [self.opcode_names[opcode]] + [self.decode(column[index]) for column in self.operands]
+
+    def __iter__(self) -> Iterator[Optional[list]]:
+        for index in range(len(self.opcodes)):
+            yield self[index]
+
+    def listing(self) -> Iterator[Tuple[int, str]]:
+        """the lines of output.txt by address, an empty line standing for every empty slot before one"""
+        last_index = -1
+        for index, instruction in enumerate(self):
+            if instruction is not None:
+                code = f"{index}\t({', '.join((str(x) if x is not None else ' ') for x in instruction)} )"
+                yield index, "\n" * (index - last_index - 1) + code
+                last_index = index
+
+    def render(self) -> str:
+        return "".join(code + "\n" for _, code in self.listing())
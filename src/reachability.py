@@ -0,0 +1,76 @@
+from bisect import bisect_right
+from typing import Iterable, List, Optional, Set, Tuple
+
+
+class Reachability:
+    """
+    The functions main can reach and the globals their code uses, over a finished program block. The code of a
+    function runs from its code address to where the next one starts, and a jump from it to the code of another
+    function is a call: no function is called before it is declared, and any other jump lands inside the function
+    or right after its end. The code outside every function, the jump to main, is where reaching starts.
+    A global is used by an instruction naming its address in any operand, other than its own initialization.
+    """
+    def __init__(self, instructions: List[list], functions: List[Tuple[int, int]], global_initializations: Iterable[int]):
+        self.instructions = instructions
+        self.functions = sorted(functions)  # (code address, end) of every function
+        self.starts = [start for start, _ in self.functions]
+        self.global_initializations = set(global_initializations)  # PB indices of ASSIGNs of a global's initial value
+
+    @staticmethod
+    def jump_target(instruction: list) -> Optional[int]:
+        target = instruction[1] if instruction[0] == "JP" else instruction[2] if instruction[0] == "JPF" else None
+        return target if type(target) is int else None
+
+    def function_at(self, index: int) -> Optional[int]:
+        """the number of the function whose code index is in"""
+        number = bisect_right(self.starts, index) - 1
+        if number >= 0 and index < self.functions[number][1]:
+            return number
+        return None
+
+    def callees(self, start: int, end: int) -> Set[int]:
+        callees = set()
+        for instruction in self.instructions[start:end]:
+            target = self.jump_target(instruction)
+            if target is not None and not start <= target <= end:
+                callee = self.function_at(target)
+                if callee is not None:
+                    callees.add(callee)
+        return callees
+
+    def reachable(self) -> Set[int]:
+        """the numbers of the functions reached from the code outside them"""
+        outside, index = [], 0
+        for start, end in self.functions + [(len(self.instructions), len(self.instructions))]:
+            outside.extend(self.instructions[index:start])
+            index = end
+        work = {self.function_at(target) for target in map(self.jump_target, outside) if target is not None} - {None}
+        reached = set()
+        while work:
+            number = work.pop()
+            reached.add(number)
+            work |= self.callees(*self.functions[number]) - reached
+        return reached
+
+    def unreachable(self) -> Tuple[Set[int], Set[int]]:
+        """
+        the PB indices of the code of the functions main cannot reach and of the initializations of the globals no
+        kept instruction uses, and the code addresses of those functions
+        """
+        reached = self.reachable()
+        removed, pruned = set(), set()
+        for number, (start, end) in enumerate(self.functions):
+            if number not in reached:
+                removed.update(range(start, end))
+                pruned.add(start)
+        used = set()
+        for index, instruction in enumerate(self.instructions):
+            if index in removed or index in self.global_initializations:
+                continue
+            for operand in instruction[1:]:
+                if type(operand) is int:
+                    used.add(operand)
+                elif type(operand) is str and operand[:1] in ("#", "@"):
+                    used.add(int(operand[1:]))
+        removed.update(index for index in self.global_initializations if self.instructions[index][2] not in used)
+        return removed, pruned
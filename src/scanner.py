@@ -1,8 +1,13 @@
+import bisect
 import enum
+import re
+import sys
 from abc import ABC
-from typing import Callable, Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
+from file_readers import END_OF_INPUT, SourceBuffer, read_source
 from file_writers import lexical_error_file_writer, token_file_writer
+from parser_constants import TERMINAL_IDS, Terminal
 
 
 class TokenType(enum.Enum):
@@ -18,9 +23,14 @@ class TokenType(enum.Enum):
         return self.name
 
 class Token:
-    def __init__(self, token_type: TokenType, token_string: str):
+    __slots__ = ("token_type", "token_string", "lineno", "terminal_id", "symbol_id")
+
+    def __init__(self, token_type: TokenType, token_string: str, lineno: int, terminal_id: Optional[int] = None, symbol_id: Optional[int] = None):
         self.token_type = token_type
         self.token_string = token_string
+        self.lineno = lineno
+        self.terminal_id = terminal_id  # index in TERMINALS, None for comments and whitespaces
+        self.symbol_id = symbol_id  # index in the symbol table, only for IDs and keywords
 
     def __str__(self):
         return f"({self.token_type}, {self.token_string})"
@@ -28,6 +38,38 @@ class Token:
     def __repr__(self):
         return str(self)
 
+# the grammar terminal of a token, resolved once when the scanner accepts it
+TERMINAL_ID_OF_TYPE = {
+    TokenType.ID: TERMINAL_IDS[Terminal.ID],
+    TokenType.NUM: TERMINAL_IDS[Terminal.NUM],
+    TokenType.EOF: TERMINAL_IDS[Terminal.EOF],
+}
+TERMINAL_ID_OF_LEXEME = {terminal.value: terminal_id for terminal, terminal_id in TERMINAL_IDS.items() if terminal not in [Terminal.ID, Terminal.NUM, Terminal.EOF, Terminal.EPSILON]}
+
+class SymbolTable:
+    """Insertion ordered symbols, each with a stable id: its index in symbol_table.txt"""
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def add(self, name: str) -> int:
+        symbol_id = self.ids.get(name)
+        if symbol_id is None:
+            symbol_id = len(self.names)
+            name = sys.intern(name)
+            self.ids[name] = symbol_id
+            self.names.append(name)
+        return symbol_id
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
 class ErrorType(enum.Enum):
     INVALID_INPUT = "Invalid input"
     UNCLOSED_COMMENT = "Unclosed comment"
@@ -44,11 +86,12 @@ class CharacterSet:
     SYMBOLS = "/;:,[](){}+-*=<"  # NOTE: '/' is included here
     SYMBOLS_WITHOUT_EQUAL = "/;:,[](){}+-*<"
     ORIGIN_SYMBOLS = ";:,[](){}+-*=<"
-    EOF = chr(0)
+    EOF = END_OF_INPUT
     VALID_COMMENT_DATA = "".join([chr(i) for i in range(1, 256) if chr(i) not in "/*"])
     VALID_OTHER_STAR = "".join([chr(i) for i in range(0, 256) if chr(i) not in "/"])
     VALID_OTHER_EQUAL = "".join([chr(i) for i in range(0, 256) if chr(i) not in "=s"])
     VALID_OTHER = "".join([chr(i) for i in range(0, 256) if chr(i) not in "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"]) #maybe not needed!
+    OUTSIDE_ALPHABET = "\u0100-\U0010ffff"  # regex range of chars that have no transition anywhere in the DFA
 
 
 class State(ABC):
@@ -69,9 +112,19 @@ class IntermediateState(State):
         return self.transitions.get(input_char)
 
 class TerminalState(State):
-    def __init__(self, state_id: int, get_token_func: Callable[[str], Tuple[TokenType, str, bool]]):
+    def __init__(self, state_id: int, token_type: TokenType, ignore_last: bool = False):
         super().__init__(state_id)
-        self.get_token = get_token_func
+        self.token_type = token_type
+        self.ignore_last = ignore_last  # the last read char is a lookahead and goes back to the input
+
+    def get_token(self, input_string: str) -> Tuple[TokenType, str, bool]:
+        token_string = input_string[:-1] if self.ignore_last else input_string
+        token_type = self.token_type
+        if token_type == TokenType.ID and token_string in Scanner.keywords:
+            token_type = TokenType.KEYWORD
+        elif token_type == TokenType.EOF:
+            token_string = ""
+        return token_type, token_string, self.ignore_last
 
 class ErrorState(State):
     def __init__(self, state_id: int, error_type: ErrorType):
@@ -84,30 +137,95 @@ class DFA:
         self.start_state = start_state
         self.all_states = all_states
         self.current_state = start_state
-        self.parsed_input = ""
 
     def reset(self):
         self.current_state = self.start_state
-        self.parsed_input = ""
 
     def read_input(self, input_char: str):
-        self.parsed_input += input_char
         next_state = self.current_state.get_next_state(input_char)
         if next_state and isinstance(next_state, IntermediateState):
             self.current_state = next_state
         return next_state
 
 
+class TransitionTable:
+    """
+    The same DFA, flattened for the "table" backend: states are plain ints and
+    `next_state[state << 8 | ord(char)]` is the next state id, or -1 when there is no transition.
+    """
+    INTERMEDIATE = 0
+    TERMINAL = 1
+    ERROR = 2
+
+    def __init__(self, dfa: DFA):
+        state_count = len(dfa.all_states)
+        self.start = dfa.start_state.state_id
+        self.next_state = [-1] * (state_count << 8)
+        self.kind = [TransitionTable.INTERMEDIATE] * state_count
+        self.retreat = [0] * state_count  # 1 if the last char is a lookahead that goes back to the input
+        self.token_type: List[Optional[TokenType]] = [None] * state_count
+        self.error_type: List[Optional[ErrorType]] = [None] * state_count
+
+        for index, state in enumerate(dfa.all_states):
+            assert state.state_id == index, f"State {state.state_id} is not at index {index}"
+            if isinstance(state, IntermediateState):
+                for ch, next_state in state.transitions.items():
+                    self.next_state[index << 8 | ord(ch)] = next_state.state_id
+            elif isinstance(state, TerminalState):
+                self.kind[index] = TransitionTable.TERMINAL
+                self.retreat[index] = int(state.ignore_last)
+                self.token_type[index] = state.token_type
+            elif isinstance(state, ErrorState):
+                self.kind[index] = TransitionTable.ERROR
+                self.error_type[index] = state.error_type
+
+
+class TokenStream:
+    """
+    Everything the scanner returned for one source, with what is needed to re-lex parts of it:
+    get_next_token calls always begin in the DFA start state, so a call start is a safe restart point.
+    """
+    def __init__(self, source: SourceBuffer):
+        self.source = source
+        self.tokens: List[Token] = []  # comments and whitespaces included
+        self.starts: List[int] = []  # offset where the get_next_token call of each token began
+        self.scanned: List[int] = []  # how far the input had been read when each token was returned
+        self.errors: List[List[Tuple[ErrorType, str, int]]] = []  # errors reported during each call
+        self.checkpoints: List[Tuple[int, int]] = []  # per line start: (index of the token whose call covers it, DFA state there)
+
+    def line_starts(self, begin: int, end: int) -> List[int]:
+        """offsets in [begin, end) where a line starts"""
+        newlines = self.source.newlines
+        first = bisect.bisect_left(newlines, begin - 1)
+        last = bisect.bisect_left(newlines, end - 1)
+        return ([0] if begin == 0 else []) + [newline + 1 for newline in newlines[first:last]]
+
+    def is_safe_checkpoint(self, line_index: int, start_state: int) -> bool:
+        token_index, state = self.checkpoints[line_index]
+        line_start = 0 if line_index == 0 else self.source.newlines[line_index - 1] + 1
+        return state == start_state and self.starts[token_index] == line_start
+
+
+PARALLEL_CHUNK_SIZE = 1 << 18  # chars per chunk of Scanner.lex_parallel, rounded up to a whole line
+
+
 class Scanner:
     keywords = ["if", "else", "void", "int", "for", "break", "return", "endif"]
+    backends = ["dfa", "table", "regex"]
 
-    def __init__(self, ignore_errors = False):
+    def __init__(self, ignore_errors = False, backend = "dfa"):
+        assert backend in Scanner.backends, f"Unknown scanner backend {backend}"
         self.ignore_errors = ignore_errors
+        self.backend = backend
         self.dfa = self.build_dfa()
+        self.table = TransitionTable(self.dfa)  # also used for the checkpoints of incremental re-lexing
+        self.pattern = self.build_master_pattern() if backend == "regex" else None
+        self.matches = None  # finditer over self.matched_source, only used by the regex backend
+        self.matched_source: Optional[SourceBuffer] = None
         self.end_of_file = False
-        self.lineno = 1
-        self.buffered_input = None
-        self.symbol_table = []
+        self.source: Optional[SourceBuffer] = None
+        self.stream: Optional[TokenStream] = None  # kept by lex_stream for relex
+        self.symbol_table = SymbolTable()
         for key in Scanner.keywords:
             self.adding_symbol_table(key)
 
@@ -116,60 +234,53 @@ class Scanner:
         start = IntermediateState(0)
         all_states: List[State] = [start]
         
-        get_token_symbol_without_ignore = lambda input_string: (TokenType.SYMBOL, input_string, False)
-        get_token_symbol_with_ignore = lambda input_string: (TokenType.SYMBOL, input_string[:-1], True)
-        get_token_ID = lambda input_string: (TokenType.KEYWORD if input_string[:-1] in Scanner.keywords else TokenType.ID, input_string[:-1], True)
-        get_token_NUM = lambda input_string: (TokenType.NUM, input_string[:-1], True)
-        get_token_comment = lambda input_string: (TokenType.COMMENT, input_string, False)
-        get_token_whitespace = lambda input_string: (TokenType.WHITESPACE, input_string, False)
-        
-        all_states.append(TerminalState(1, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(1, TokenType.SYMBOL))
         start.add_transition(';', all_states[1])
-        all_states.append(TerminalState(2, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(2, TokenType.SYMBOL))
         start.add_transition(':', all_states[2])
-        all_states.append(TerminalState(3, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(3, TokenType.SYMBOL))
         start.add_transition(',', all_states[3])
-        all_states.append(TerminalState(4, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(4, TokenType.SYMBOL))
         start.add_transition('[', all_states[4])
-        all_states.append(TerminalState(5, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(5, TokenType.SYMBOL))
         start.add_transition(']', all_states[5])
-        all_states.append(TerminalState(6, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(6, TokenType.SYMBOL))
         start.add_transition('(', all_states[6])
-        all_states.append(TerminalState(7, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(7, TokenType.SYMBOL))
         start.add_transition(')', all_states[7])
-        all_states.append(TerminalState(8, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(8, TokenType.SYMBOL))
         start.add_transition('{', all_states[8])
-        all_states.append(TerminalState(9, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(9, TokenType.SYMBOL))
         start.add_transition('}', all_states[9])
-        all_states.append(TerminalState(10, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(10, TokenType.SYMBOL))
         start.add_transition('+', all_states[10])
-        all_states.append(TerminalState(11, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(11, TokenType.SYMBOL))
         start.add_transition('-', all_states[11])
         all_states.append(IntermediateState(12))
         start.add_transition('*', all_states[12])
-        all_states.append(TerminalState(13, get_token_symbol_with_ignore))
+        all_states.append(TerminalState(13, TokenType.SYMBOL, ignore_last=True))
         all_states[12].add_transition(CharacterSet.VALID_OTHER_STAR, all_states[13])
         all_states.append(ErrorState(14, ErrorType.UNMATCHED_COMMENT))
         all_states[12].add_transition('/', all_states[14])
         all_states.append(IntermediateState(15))
         start.add_transition('=', all_states[15])
-        all_states.append(TerminalState(16, get_token_symbol_with_ignore))
+        all_states.append(TerminalState(16, TokenType.SYMBOL, ignore_last=True))
         all_states[15].add_transition(CharacterSet.VALID_OTHER_EQUAL, all_states[16])
-        all_states.append(TerminalState(17, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(17, TokenType.SYMBOL))
         all_states[15].add_transition('=', all_states[17])
-        all_states.append(TerminalState(18, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(18, TokenType.SYMBOL))
         start.add_transition('<', all_states[18])
         
         all_states.append(IntermediateState(19))
         start.add_transition(CharacterSet.LETTERS, all_states[19])
         all_states[19].add_transition(CharacterSet.DIGITS+CharacterSet.LETTERS, all_states[19])
-        all_states.append(TerminalState(20, get_token_ID))
+        all_states.append(TerminalState(20, TokenType.ID, ignore_last=True))
         all_states[19].add_transition(CharacterSet.WHITESPACE+CharacterSet.EOF+CharacterSet.SYMBOLS, all_states[20])
         
         all_states.append(IntermediateState(21))
         start.add_transition(CharacterSet.DIGITS, all_states[21])
         all_states[21].add_transition(CharacterSet.DIGITS, all_states[21])
-        all_states.append(TerminalState(22, get_token_NUM))
+        all_states.append(TerminalState(22, TokenType.NUM, ignore_last=True))
         all_states[21].add_transition(CharacterSet.VALID_OTHER, all_states[22])
         all_states.append(ErrorState(23, ErrorType.INVALID_NUMBER))
         all_states[21].add_transition(CharacterSet.LETTERS, all_states[23])
@@ -182,35 +293,63 @@ class Scanner:
         all_states[25].add_transition('*', all_states[26])
         all_states[25].add_transition(CharacterSet.VALID_COMMENT_DATA+"/", all_states[25])
         all_states[26].add_transition(CharacterSet.VALID_COMMENT_DATA+"*", all_states[25])
-        all_states.append(TerminalState(27, get_token_comment))
+        all_states.append(TerminalState(27, TokenType.COMMENT))
         all_states[26].add_transition('/', all_states[27])
         all_states.append(ErrorState(28, ErrorType.UNCLOSED_COMMENT))
         all_states[25].add_transition(CharacterSet.EOF, all_states[28])
         all_states[26].add_transition(CharacterSet.EOF, all_states[28])
         
-        all_states.append(TerminalState(29, get_token_whitespace))
+        all_states.append(TerminalState(29, TokenType.WHITESPACE))
         start.add_transition(CharacterSet.WHITESPACE, all_states[29])
 
-        all_states.append(TerminalState(30, get_token_symbol_without_ignore))
+        all_states.append(TerminalState(30, TokenType.SYMBOL))
         
-        end = TerminalState(31, lambda x: (TokenType.EOF, "", False))
+        end = TerminalState(31, TokenType.EOF)
         all_states.append(end)
         start.add_transition(CharacterSet.EOF, end)  # self loop for EOF to handle the last token
         
         return DFA(start, all_states)
 
+    @staticmethod
+    def build_master_pattern() -> re.Pattern:
+        """
+        One alternation that tiles the input with the same lexemes the DFA produces.
+        Lookahead chars are zero-width, so matches follow each other without gaps and
+        each group name tells what the DFA would have ended in.
+        """
+        def chars(charset: str, extra: str = "") -> str:
+            return "[" + "".join(re.escape(ch) for ch in charset) + extra + "]"
+
+        def not_chars(charset: str) -> str:
+            return "[^" + "".join(re.escape(ch) for ch in charset) + CharacterSet.OUTSIDE_ALPHABET + "]"
+
+        letter, digit = chars(CharacterSet.LETTERS), chars(CharacterSet.DIGITS)
+        blank = chars(CharacterSet.WHITESPACE.replace("\n", ""))
+        comment_body = rf"/\*(?:{not_chars('*' + CharacterSet.EOF)}|\*{not_chars('/' + CharacterSet.EOF)})*"
+        alternatives = [
+            # a run ends at a newline, so no token depends on the first char of the next line
+            ("WHITESPACE", rf"{blank}*\n|{blank}+"),
+            ("ID", rf"{letter}(?:{letter}|{digit})*(?={chars(CharacterSet.WHITESPACE + CharacterSet.EOF + CharacterSet.SYMBOLS)})"),
+            ("NUM", rf"{digit}+(?={not_chars(CharacterSet.DIGITS + CharacterSet.LETTERS)})"),
+            ("SYMBOL", rf"==|{chars(CharacterSet.ORIGIN_SYMBOLS.replace('*', '').replace('=', ''))}"),
+            ("SYMBOL_LOOKAHEAD", rf"\*(?={not_chars('/')})|=(?={not_chars('=s')})"),
+            ("COMMENT", rf"{comment_body}\*/"),
+            ("COMMENT_ERROR", rf"{comment_body}\*?."),  # ends with EOF or a char outside the alphabet
+            ("UNMATCHED_COMMENT", r"\*/"),
+            ("INVALID_NUMBER", rf"{digit}+{letter}"),
+            ("EOF", re.escape(CharacterSet.EOF)),
+            ("INVALID_INPUT", rf"{letter}(?:{letter}|{digit})*.|{digit}+.|[=*/].|."),
+        ]
+        return re.compile("|".join(f"(?P<{name}>{regex})" for name, regex in alternatives), re.DOTALL)
+
+    @property
+    def lineno(self) -> int:
+        return self.source.lineno if self.source else 1
+
     def read_char(self) -> str:
-        if self.buffered_input:
-            input_char = self.buffered_input
-            self.buffered_input = None
-            return input_char
-        
-        input_char = self.input_file.read(1)
-        if len(input_char) == 0 or input_char == CharacterSet.EOF:
-            input_char = CharacterSet.EOF
+        input_char = self.source.read_char()
+        if input_char == CharacterSet.EOF:
             self.end_of_file = True
-        if input_char == "\n":
-            self.lineno += 1
         return input_char
 
     def report_error(self, lineno: int, error_type: ErrorType, message: str):
@@ -221,46 +360,351 @@ class Scanner:
 
         self.write_error_to_file(error_type, message, lineno)
         
-    def adding_symbol_table(self, input_string: str):
-        if input_string not in self.symbol_table:
-            self.symbol_table.append(input_string)
+    def adding_symbol_table(self, input_string: str) -> int:
+        return self.symbol_table.add(input_string)
 
-    def get_next_token(self) -> Tuple[Token, int]:
+    @staticmethod
+    def make_token(token_type: TokenType, token_string: str, lineno: int) -> Token:
+        if token_type == TokenType.SYMBOL:
+            terminal_id = TERMINAL_ID_OF_LEXEME.get(token_string)
+        else:
+            terminal_id = TERMINAL_ID_OF_TYPE.get(token_type)
+        return Token(token_type, token_string, lineno, terminal_id)
+
+    def symbol_token(self, token_type: TokenType, token_string: str, lineno: int) -> Token:
+        symbol_id = self.adding_symbol_table(token_string)
+        if token_type == TokenType.KEYWORD:
+            terminal_id = TERMINAL_ID_OF_LEXEME[token_string]
+        else:
+            terminal_id = TERMINAL_ID_OF_TYPE[token_type]
+        return Token(token_type, self.symbol_table.names[symbol_id], lineno, terminal_id, symbol_id)
+
+    def get_next_token(self) -> Token:
+        if self.backend == "table":
+            return self.get_next_token_from_table()
+        if self.backend == "regex":
+            return self.get_next_token_from_regex()
         lineno = self.lineno
+        source = self.source
+        begin = source.position
         while not self.end_of_file:
             input_char = self.read_char()
             state = self.dfa.read_input(input_char)
 
             if state is None:
-                self.report_error(lineno, ErrorType.INVALID_INPUT, self.dfa.parsed_input)
+                self.report_error(lineno, ErrorType.INVALID_INPUT, source.slice(begin, source.position))
                 self.dfa.reset()
+                begin = source.position
                 continue
 
             if isinstance(state, ErrorState):
-                self.report_error(lineno, state.error_type, self.dfa.parsed_input)
+                self.report_error(lineno, state.error_type, source.slice(begin, source.position))
                 self.dfa.reset()
+                begin = source.position
                 continue
 
             if isinstance(state, TerminalState):
-                token_type, token_string, ignore_last = state.get_token(self.dfa.parsed_input)
-
-                if token_type == TokenType.ID:
-                    self.adding_symbol_table(token_string)
+                token_type, token_string, ignore_last = state.get_token(source.slice(begin, source.position))
 
                 if ignore_last:
-                    self.buffered_input = self.dfa.parsed_input[-1]
+                    source.unread()
                 self.dfa.reset()
-                return Token(token_type, token_string), lineno
+                if token_type in [TokenType.ID, TokenType.KEYWORD]:
+                    return self.symbol_token(token_type, token_string, lineno)
+                return self.make_token(token_type, token_string, lineno)
+
+        return self.make_token(TokenType.EOF, "", lineno)
+
+    def get_next_token_from_table(self) -> Token:
+        source = self.source
+        text = source.text
+        table = self.table
+        next_state = table.next_state
+        kind = table.kind
+        lineno = source.lineno
+        position = source.position
+        while not self.end_of_file:
+            begin = position
+            state = table.start
+            while True:
+                code = ord(text[position])
+                position += 1
+                state = next_state[state << 8 | code] if code < 256 else -1
+                if state < 0 or kind[state] != TransitionTable.INTERMEDIATE:
+                    break
+
+            if position > source.scanned:
+                source.scanned = position
+                self.end_of_file = position == len(text)
+
+            if state < 0:
+                self.report_error(lineno, ErrorType.INVALID_INPUT, text[begin:position])
+                continue
+
+            if kind[state] == TransitionTable.ERROR:
+                self.report_error(lineno, table.error_type[state], text[begin:position])
+                continue
 
-        return Token(TokenType.EOF, ""), lineno
+            position -= table.retreat[state]
+            source.position = position
+            token_type = table.token_type[state]
+            token_string = text[begin:position]
+            if token_type == TokenType.ID:
+                if token_string in Scanner.keywords:
+                    token_type = TokenType.KEYWORD
+                return self.symbol_token(token_type, token_string, lineno)
+            if token_type == TokenType.EOF:
+                token_string = ""
+            return self.make_token(token_type, token_string, lineno)
+
+        source.position = position
+        return self.make_token(TokenType.EOF, "", lineno)
+
+    def get_next_token_from_regex(self) -> Token:
+        source = self.source
+        if self.matched_source is not source:
+            self.matches = self.pattern.finditer(source.text, source.position)
+            self.matched_source = source
+        lineno = source.lineno
+        for match in self.matches:
+            kind = match.lastgroup
+            begin, end = match.span()
+            # ID, NUM, '*' and '=' have read one more char than the lexeme
+            scanned = end + 1 if kind in ("ID", "NUM", "SYMBOL_LOOKAHEAD") else end
+            source.position = end
+            if scanned > source.scanned:
+                source.scanned = scanned
+                self.end_of_file = scanned == len(source.text)
+
+            if kind == "COMMENT_ERROR":
+                error_type = ErrorType.UNCLOSED_COMMENT if source.text[end - 1] == CharacterSet.EOF else ErrorType.INVALID_INPUT
+                self.report_error(lineno, error_type, match.group())
+            elif kind in ("INVALID_INPUT", "INVALID_NUMBER", "UNMATCHED_COMMENT"):
+                self.report_error(lineno, ErrorType[kind], match.group())
+            elif kind == "EOF":
+                return self.make_token(TokenType.EOF, "", lineno)
+            else:
+                token_string = match.group()
+                if kind == "ID":
+                    token_type = TokenType.KEYWORD if token_string in Scanner.keywords else TokenType.ID
+                    return self.symbol_token(token_type, token_string, lineno)
+                token_type = TokenType.SYMBOL if kind == "SYMBOL_LOOKAHEAD" else TokenType[kind]
+                return self.make_token(token_type, token_string, lineno)
+
+            if self.end_of_file:
+                break
+
+        return self.make_token(TokenType.EOF, "", lineno)
+
+    def lex_call(self, stream: TokenStream):
+        """one get_next_token call, recorded in the stream"""
+        errors = []
+        self.write_error_to_file = lambda error_type, message, lineno: errors.append((error_type, message, lineno))
+        stream.starts.append(self.source.position)
+        stream.tokens.append(self.get_next_token())
+        stream.scanned.append(self.source.scanned)
+        stream.errors.append(errors)
+
+    def add_checkpoints(self, stream: TokenStream, first: int, last: int):
+        """checkpoints of the line starts inside the calls of tokens [first, last)"""
+        text = stream.source.text
+        table = self.table
+        for token_index in range(first, last):
+            begin = stream.starts[token_index]
+            end = stream.starts[token_index + 1] if token_index + 1 < len(stream.starts) else len(text)
+            state, position = table.start, begin
+            for line_start in stream.line_starts(begin, end):
+                # walk the DFA like get_next_token does; a call only ends at its terminal state, so none is met here
+                for ch in text[position:line_start]:
+                    code = ord(ch)
+                    state = table.next_state[state << 8 | code] if code < 256 else -1
+                    if state < 0 or table.kind[state] == TransitionTable.ERROR:
+                        state = table.start
+                position = line_start
+                stream.checkpoints.append((token_index, state))
+
+    def lex_stream(self) -> List[Token]:
+        """lex the whole self.source, keeping the token stream and line checkpoints for relex"""
+        write_error_to_file = getattr(self, "write_error_to_file", None)
+        self.stream = TokenStream(self.source)
+        while not self.end_of_file:
+            self.lex_call(self.stream)
+        self.add_checkpoints(self.stream, 0, len(self.stream.tokens))
+        self.write_error_to_file = write_error_to_file
+        return self.stream.tokens
+
+    def relex(self, begin: int, end: int, replacement: str) -> Tuple[List[Token], range]:
+        """
+        Replace source.text[begin:end] with replacement and re-lex only what the edit can change:
+        from the last line start before the edit that is a call boundary, until a call starts at the
+        same place (after the edit) as an old one with the input read equally far.
+        Returns the new token stream and the range of its tokens that were re-lexed.
+        The old tokens after that range are reused, with their line numbers shifted in place.
+        """
+        old = self.stream
+        old_text = old.source.text[:-1]
+        delta = len(replacement) - (end - begin)
+        line_delta = replacement.count("\n") - old_text.count("\n", begin, end)
+        self.source = source = SourceBuffer(old_text[:begin] + replacement + old_text[end:])
+        new = self.stream = TokenStream(source)
+
+        line_index = old.source.line_at(begin) - 1
+        while line_index > 0 and not old.is_safe_checkpoint(line_index, self.table.start):
+            line_index -= 1
+        first = old.checkpoints[line_index][0]
+        restart = old.starts[first]
+        new.tokens, new.starts, new.scanned, new.errors = old.tokens[:first], old.starts[:first], old.scanned[:first], old.errors[:first]
+        new.checkpoints = old.checkpoints[:line_index]
+
+        self.seek(restart, restart)
+        write_error_to_file = getattr(self, "write_error_to_file", None)
+        resync = None
+        while not self.end_of_file:
+            call_start = source.position
+            if call_start >= begin + len(replacement) and len(new.tokens) > first:
+                old_index = bisect.bisect_left(old.starts, call_start - delta, first)
+                old_scanned = old.scanned[old_index - 1] if old_index > 0 else 0
+                if old_index < len(old.starts) and old.starts[old_index] == call_start - delta and old_scanned + delta == source.scanned:
+                    resync = old_index
+                    break
+            self.lex_call(new)
+        self.write_error_to_file = write_error_to_file
+        relexed = range(first, len(new.tokens))
+
+        if resync is None:
+            self.add_checkpoints(new, first, relexed.stop)
+        else:
+            new.tokens += old.tokens[resync:]
+            new.starts += [offset + delta for offset in old.starts[resync:]] if delta else old.starts[resync:]
+            new.scanned += [offset + delta for offset in old.scanned[resync:]] if delta else old.scanned[resync:]
+            if line_delta:
+                for token in old.tokens[resync:]:
+                    token.lineno += line_delta
+                new.errors += [[(error_type, message, lineno + line_delta) for error_type, message, lineno in errors] if errors else errors for errors in old.errors[resync:]]
+            else:
+                new.errors += old.errors[resync:]
+            self.add_checkpoints(new, first, relexed.stop)
+            if source.text[new.starts[relexed.stop] - 1] == "\n":  # that newline may come from the edit
+                new.checkpoints.append((relexed.stop, self.table.start))
+            tail_line = bisect.bisect_left(old.source.newlines, old.starts[resync]) + 1  # first old line starting after the resync point
+            shift = relexed.stop - resync
+            new.checkpoints += [(token_index + shift, state) for token_index, state in old.checkpoints[tail_line:]]
+            source.position = source.scanned = len(source.text)
+            self.end_of_file = True
+        return new.tokens, relexed
 
-    def tokenize(self):
-        with open("input.txt", "r") as self.input_file, token_file_writer() as write_token_to_file, lexical_error_file_writer() as self.write_error_to_file:
-            while not self.end_of_file:
-                token, lineno = self.get_next_token()
+    def seek(self, position: int, scanned: int):
+        """continue lexing self.source from a call boundary"""
+        self.source.position = position
+        self.source.scanned = scanned
+        self.end_of_file = scanned == len(self.source.text)
+        self.dfa.reset()
+        self.matched_source = None
+
+    def iter_tokens(self):
+        while not self.end_of_file:
+            yield self.get_next_token()
+
+    def lex_parallel(self, workers: int, chunk_size: int = PARALLEL_CHUNK_SIZE) -> List[Token]:
+        """
+        Same tokens, errors and symbol table as calling get_next_token until the end of self.source,
+        but chunks of whole lines are lexed speculatively in a process pool, each one as if a call began at its start.
+        A chunk is used from its first call that starts where the sequential lexing really is, with the input
+        read equally far; a wrong guess (e.g. a chunk starting inside a comment) is lexed here until that happens.
+        """
+        import multiprocessing  # not imported at the top, so the compiler does not pay for it on every start
+        text = self.source.text
+        chunks = []
+        begin = 0
+        while begin < len(text):
+            end = text.find("\n", begin + chunk_size) + 1 or len(text)
+            chunks.append((begin, end))
+            begin = end
+
+        tokens = []
+        position = scanned = self.source.position
+        with multiprocessing.Pool(workers, init_chunk_worker, (text, self.backend, self.ignore_errors)) as pool:
+            for (begin, end), (starts, scanneds, chunk_end, chunk_tokens, chunk_errors) in zip(chunks, pool.imap(lex_chunk, chunks)):
+                while position < end and scanned < len(text):
+                    index = bisect.bisect_left(starts, position)
+                    if index < len(starts) and starts[index] == position and (scanneds[index - 1] if index else begin) == scanned:
+                        for call_index, *error in chunk_errors:
+                            if call_index >= index:
+                                self.write_error_to_file(*error)
+                        for token_type, token_string, lineno, terminal_id in zip(*(column[index:] for column in chunk_tokens)):
+                            if token_type == TokenType.ID or token_type == TokenType.KEYWORD:
+                                tokens.append(self.symbol_token(token_type, token_string, lineno))
+                            else:
+                                tokens.append(Token(token_type, token_string, lineno, terminal_id))
+                        position, scanned = chunk_end, scanneds[-1]
+                        break
+                    self.seek(position, scanned)
+                    tokens.append(self.get_next_token())
+                    position, scanned = self.source.position, self.source.scanned
+        self.seek(position, scanned)
+        return tokens
+
+    def tokenize(self, flush_policy: str = "write", workers: int = 1):
+        self.source = read_source("input.txt")
+        with token_file_writer(flush_policy) as write_token_to_file, lexical_error_file_writer(flush_policy) as self.write_error_to_file:
+            for token in (self.lex_parallel(workers) if workers > 1 else self.iter_tokens()):
                 if token.token_type in [TokenType.ID, TokenType.NUM, TokenType.KEYWORD, TokenType.SYMBOL]:
-                    write_token_to_file(token, lineno)
+                    write_token_to_file(token, token.lineno)
 
         with open("symbol_table.txt", "w") as file:
             for i, symbol in enumerate(self.symbol_table):
-                file.write(f"{i+1}.\t{symbol}\n")
\ No newline at end of file
+                file.write(f"{i+1}.\t{symbol}\n")
+
+
+# process pool side of Scanner.lex_parallel
+chunk_scanner: Optional[Scanner] = None
+
+def init_chunk_worker(text: str, backend: str, ignore_errors: bool):
+    global chunk_scanner
+    chunk_scanner = Scanner(ignore_errors, backend)
+    chunk_scanner.source = SourceBuffer(text)
+
+def lex_chunk(chunk: Tuple[int, int]):
+    """lex the calls starting in [begin, end), guessing that one starts at begin"""
+    begin, end = chunk
+    scanner = chunk_scanner
+    source = scanner.source
+    scanner.seek(begin, begin)
+    starts, scanned, token_types, token_strings, linenos, terminal_ids, errors = [], [], [], [], [], [], []
+    # errors are rare, so they are kept apart with the index of their call
+    scanner.write_error_to_file = lambda error_type, message, lineno: errors.append((len(starts) - 1, error_type, message, lineno))
+    while not scanner.end_of_file and source.position < end:
+        starts.append(source.position)
+        token = scanner.get_next_token()
+        scanned.append(source.scanned)
+        token_types.append(token.token_type)
+        token_strings.append(token.token_string)
+        linenos.append(token.lineno)
+        terminal_ids.append(token.terminal_id)
+    return starts, scanned, source.position, (token_types, token_strings, linenos, terminal_ids), errors
+
+if __name__ == '__main__':
+    # differential check: every backend must give the dfa backend's tokens, errors and symbol table
+    # usage: python scanner.py <input files>
+
+    def scan(filename: str, backend: str):
+        scanner = Scanner(backend=backend)
+        scanner.source = read_source(filename)
+        errors = []
+        scanner.write_error_to_file = lambda error_type, message, lineno: errors.append((lineno, str(error_type), message))
+        tokens = []
+        while not scanner.end_of_file:
+            token = scanner.get_next_token()
+            if token.token_type in [TokenType.ID, TokenType.NUM, TokenType.KEYWORD, TokenType.SYMBOL]:
+                tokens.append((token.lineno, str(token), token.terminal_id, token.symbol_id))
+        return tokens, errors, list(scanner.symbol_table)
+
+    failed = False
+    for filename in sys.argv[1:]:
+        expected = scan(filename, "dfa")
+        for backend in Scanner.backends[1:]:
+            if scan(filename, backend) != expected:
+                print(f"{filename}: {backend} backend differs from dfa")
+                failed = True
+    print(f"{len(sys.argv) - 1} inputs checked, " + ("backends differ" if failed else "all backends agree"))
+    sys.exit(failed)
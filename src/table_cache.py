@@ -0,0 +1,92 @@
+import importlib.util
+import os
+import pickle
+import sys
+import zlib
+from types import ModuleType
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+# the tables are saved next to the compiled modules unless CMINUS_CACHE_DIR says otherwise
+CACHE_DIR = os.environ.get("CMINUS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__"))
+CACHE_VERSION = 1  # bump when the layout of a cached object changes, the code building it belongs in its key
+
+
+def describe(key) -> str:
+    return repr((CACHE_VERSION, sys.version_info[:2], key))
+
+
+def key_hash(description: str) -> str:
+    return f"{zlib.crc32(description.encode()):08x}"
+
+
+def write_atomically(path: str, content: bytes):
+    """raises OSError if the cache is unwritable, leaving no partial file behind"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(temp_path, "wb") as file:
+            file.write(content)
+        os.replace(temp_path, path)  # concurrent compilers never see a half written file
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def cached(name: str, key, build: Callable[[], T]) -> T:
+    """
+    Loads the object saved for name and key, or builds and saves it. key is everything the object is computed from,
+    its repr must change whenever the object would. The file is named by a hash of the key and holds the key itself,
+    so a changed key is never served a stale object; a missing, broken or unwritable cache only costs the build.
+    """
+    description = describe(key)
+    path = os.path.join(CACHE_DIR, f"{name}.{key_hash(description)}.pickle")
+    try:
+        with open(path, "rb") as file:
+            saved_description, value = pickle.load(file)
+        if saved_description == description:
+            return value
+    except Exception:
+        pass
+
+    value = build()
+    try:
+        write_atomically(path, pickle.dumps((description, value), pickle.HIGHEST_PROTOCOL))
+    except OSError:
+        pass
+    return value
+
+
+def cached_module(name: str, key, generate: Callable[[], str]) -> ModuleType:
+    """
+    Like cached, for generated source code: the module is saved as {name}_{hash}.py, a plain file that can be read
+    and that Python keeps compiled bytecode for, with the key in its CACHE_KEY to check it against.
+    """
+    description = describe(key)
+    module_name = f"{name}_{key_hash(description)}"
+    path = os.path.join(CACHE_DIR, f"{module_name}.py")
+    if os.path.exists(path):
+        try:
+            module = load_module(module_name, path)
+            if getattr(module, "CACHE_KEY", None) == description:
+                return module
+        except Exception:
+            pass
+
+    source = f"{generate()}\n\nCACHE_KEY = {description!r}\n"
+    try:
+        write_atomically(path, source.encode())
+    except OSError:
+        module = ModuleType(module_name)
+        exec(compile(source, path, "exec"), module.__dict__)
+        return module
+    return load_module(module_name, path)
+
+
+def load_module(module_name: str, path: str) -> ModuleType:
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module